@@ -0,0 +1,227 @@
+# File: tools/yike-album/async_engine.py
+"""异步下载引擎：单事件循环 + httpx.AsyncClient + 信号量控制并发
+
+跳过/大小与校验和校验/失败规则与 download.download_item 完全一致，
+同样按媒体类型（media.py）选择传输参数。
+"""
+import asyncio
+import time
+from pathlib import Path
+
+import httpx
+
+import bandwidth
+import checksum
+import dedup
+import dlink_cache
+import fileindex
+import media
+import resume
+from transport import make_async_client
+
+# 攒够这么多字节再交给线程写盘，避免每个 chunk 一次线程切换
+WRITE_BUFFER = 1024 * 1024
+
+# 传输名额：只在搬运字节时占用，等 API 令牌的协程不占；由 _run 创建
+_transfer_sem: asyncio.Semaphore = None
+
+
+async def stream_to_file(
+    client: httpx.AsyncClient, url: str, dest: Path,
+    chunk_size: int, timeout, headers: dict = None, digest=None,
+) -> int:
+    """流式下载到文件，写盘放到线程里做，不阻塞事件循环；返回写入字节数
+
+    传入 digest 时边收边算校验和。
+    """
+    written = 0
+    async with client.stream(
+        "GET", url, timeout=timeout, headers=headers,
+    ) as resp:
+        resp.raise_for_status()
+        f = await asyncio.to_thread(open, dest, "wb")
+        try:
+            buf = bytearray()
+            with bandwidth.stream() as bw:
+                async for chunk in resp.aiter_bytes(chunk_size):
+                    buf += chunk
+                    written += len(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    await bw.consume_async(len(chunk))
+                    if len(buf) >= WRITE_BUFFER:
+                        await asyncio.to_thread(f.write, bytes(buf))
+                        buf.clear()
+            if buf:
+                await asyncio.to_thread(f.write, bytes(buf))
+        finally:
+            await asyncio.to_thread(f.close)
+    return written
+
+
+async def stream_resumable(
+    client: httpx.AsyncClient, url: str, dest: Path, expected_size: int,
+    chunk_size: int, timeout, digest=None,
+) -> int:
+    """异步版 resume.download：写 .part，支持 Range 续传，返回最终大小"""
+    part, _ = resume.part_paths(dest)
+    offset = resume.resume_offset(dest, expected_size)
+    if expected_size and offset == expected_size:
+        if digest is not None:
+            digest.invalidate()
+        return resume.finish(dest, expected_size)
+    if offset:
+        print(f"  [续传] {dest.name}: 从 {offset:,} 字节继续")
+    try:
+        async with client.stream(
+            "GET", url, timeout=timeout,
+            headers=resume.range_headers(offset),
+        ) as resp:
+            if resp.status_code == 416:
+                resume.discard(dest)
+            resp.raise_for_status()
+            mode = resume.open_mode(resp, offset)
+            await asyncio.to_thread(resume.start_digest, digest, part, mode,
+                                    offset)
+            resume.save_state(dest, url, offset if mode == "ab" else 0,
+                              expected_size)
+            f = await asyncio.to_thread(open, part, mode)
+            try:
+                buf = bytearray()
+                with bandwidth.stream() as bw:
+                    async for chunk in resp.aiter_bytes(chunk_size):
+                        buf += chunk
+                        if digest is not None:
+                            digest.update(chunk)
+                        await bw.consume_async(len(chunk))
+                        if len(buf) >= WRITE_BUFFER:
+                            await asyncio.to_thread(f.write, bytes(buf))
+                            buf.clear()
+                if buf:
+                    await asyncio.to_thread(f.write, bytes(buf))
+            finally:
+                await asyncio.to_thread(f.close)
+    finally:
+        if part.exists():
+            resume.save_state(dest, url, part.stat().st_size, expected_size)
+    return resume.finish(dest, expected_size)
+
+
+async def download_item(
+    client: httpx.AsyncClient, item, download_dir: Path
+) -> bool:
+    """异步版 download.download_item（item 为 records.MediaItem）：
+    照片整文件直写，视频走 .part 续传"""
+    profile = media.profile_for(item)
+    fsid = item.fsid
+    filename = item.filename
+    expected_size = item.size
+    dest = download_dir / filename
+    # 索引由 download.run_batches 提前建好，这里只查内存
+    index = fileindex.for_dir(download_dir)
+    have = index.size(filename)
+    if have is not None:
+        # 已存在且大小匹配、库中校验和与 md5 不冲突 → 跳过
+        stale = checksum.verify(item.md5, item.checksum)
+        if expected_size and have == expected_size and not stale:
+            return True
+        # 其余情况一律先删掉再重下：dest 可能是去重硬链接，原地 "wb" 会改写源文件
+        reason = stale or (f"大小不匹配 {have} vs {expected_size}"
+                           if expected_size else "大小未知")
+        print(f"  [重下] {filename}: {reason}")
+        dest.unlink(missing_ok=True)
+        index.remove(filename)
+    if await asyncio.to_thread(dedup.content.link_existing, item, download_dir):
+        return True
+    try:
+        dlink = await dlink_cache.get_download_link_async(client, fsid)
+    except RuntimeError as e:
+        print(f"  [跳过] {filename}: {e}")
+        return False
+    digest = checksum.for_item(item)
+    start = time.monotonic()
+    try:
+        async with _transfer_sem:
+            if profile.resumable:
+                size = await stream_resumable(
+                    client, dlink, dest, expected_size, profile.chunk_size,
+                    profile.timeout, digest=digest,
+                )
+            else:
+                size = await stream_to_file(
+                    client, dlink, dest, profile.chunk_size, profile.timeout,
+                    headers=profile.headers, digest=digest,
+                )
+    except RuntimeError as e:
+        print(f"  [校验失败] {filename}: {e}")
+        return False
+    except Exception as e:
+        print(f"  [失败] {filename}: {e}")
+        dlink_cache.invalidate_on_error(fsid, e)
+        if not profile.resumable:
+            dest.unlink(missing_ok=True)
+        return False
+    media.stats.transfer(item, size, time.monotonic() - start)
+    problem = profile.check(size, expected_size)
+    if not problem:
+        item.checksum = await asyncio.to_thread(checksum.finish, digest, dest)
+        problem = checksum.verify(item.md5, item.checksum)
+    if problem:
+        print(f"  [校验失败] {filename}: {problem}")
+        dest.unlink(missing_ok=True)
+        return False
+    st = await asyncio.to_thread(dest.stat)
+    index.add(filename, size, st.st_mtime)
+    await asyncio.to_thread(dedup.content.after_download, item, download_dir,
+                            item.checksum)
+    return True
+
+
+_END = object()
+
+
+async def _run(items, cookies: dict, download_fn, on_result, concurrency: int):
+    global _transfer_sem
+    _transfer_sem = asyncio.Semaphore(concurrency)
+    # 同时存在的任务多留一倍：一半在传输，另一半可提前取链接
+    sem = asyncio.Semaphore(concurrency * 2)
+    async with make_async_client(cookies, concurrency) as client:
+
+        async def one(item):
+            try:
+                ok = await download_fn(client, item)
+            except Exception as e:
+                # 未预料的异常同样记为失败，保证每个条目都有结果
+                print(f"  [异常] {item.filename}: {e}")
+                ok = False
+            finally:
+                sem.release()
+            on_result(item, ok)
+
+        tasks = set()
+        it = iter(items)
+        while True:
+            # 先拿到信号量再建任务，避免一次性创建全部任务
+            await sem.acquire()
+            # items 可能是边翻页边产出的生成器，取下一项放到线程里，不阻塞事件循环
+            item = next(it, _END) if isinstance(items, (list, tuple)) \
+                else await asyncio.to_thread(next, it, _END)
+            if item is _END:
+                sem.release()
+                break
+            t = asyncio.create_task(one(item))
+            tasks.add(t)
+            t.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def run(items, cookies: dict, download_fn, on_result, concurrency: int) -> float:
+    """用异步引擎跑完 items，返回耗时(秒)
+
+    download_fn(client, item) -> bool 为协程；on_result(item, ok) 在事件循环线程回调。
+    """
+    start = time.monotonic()
+    asyncio.run(_run(items, cookies, download_fn, on_result, concurrency))
+    dlink_cache.cache.save()
+    return time.monotonic() - start
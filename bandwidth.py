@@ -0,0 +1,206 @@
+# File: tools/yike-album/bandwidth.py
+"""全局带宽上限：所有传输的流式循环共享一个字节速率，活跃传输按需公平分配
+
+每个传输至少能拿到 上限/活跃数 的公平份额；自身跑不满份额的传输（网络慢、
+源站慢）只占它实际用掉的，剩下的带宽让给其他还有需求的传输，总量不浪费。
+
+上限可按时段切换，例如 YIKE_BANDWIDTH_SCHEDULE="08:00-23:00=2M,23:00-08:00=0"
+（0 表示不限速）；未命中任何时段时用 YIKE_BANDWIDTH。
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import BANDWIDTH_LIMIT, BANDWIDTH_SCHEDULE
+
+# 允许的突发量（按秒计）：空闲后可以先放这么多时间的数据
+BURST_SECONDS = 0.5
+# 实测吞吐的统计窗口(秒)
+METER_WINDOW = 5.0
+# 单个传输的速率统计窗口(秒)
+STREAM_WINDOW = 1.0
+# 窗口内等待限速的时间超过这个比例，视为带宽不够用（仍有需求）
+STARVE_RATIO = 0.1
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_rate(text: str) -> float:
+    """'2M' / '512K' / '1000' → 字节/秒；空或 0 表示不限速"""
+    text = (text or "").strip().upper().replace("/S", "").rstrip("B")
+    if not text:
+        return 0.0
+    unit = text[-1] if text[-1] in _UNITS else ""
+    number = text[:-1] if unit else text
+    return float(number) * _UNITS[unit]
+
+
+def _minutes(hhmm: str) -> int:
+    h, m = hhmm.strip().split(":")
+    return int(h) * 60 + int(m)
+
+
+def parse_schedule(text: str) -> list:
+    """'08:00-23:00=2M,23:00-08:00=0' → [(起始分钟, 结束分钟, 字节/秒)]"""
+    rules = []
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        span, _, rate = part.partition("=")
+        start, _, end = span.partition("-")
+        rules.append((_minutes(start), _minutes(end), parse_rate(rate)))
+    return rules
+
+
+def rate_at(rules: list, default: float, now: datetime) -> float:
+    """按本地时间查当前时段上限，支持跨午夜的时段"""
+    minute = now.hour * 60 + now.minute
+    for start, end, rate in rules:
+        if start <= end:
+            if start <= minute < end:
+                return rate
+        elif minute >= start or minute < end:
+            return rate
+    return default
+
+
+class _Stream:
+    """单个传输的配额状态与最近一个窗口的实测速率"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.next_time = 0.0
+        self.rate = 0.0
+        self.starved = False
+        self._win_start = time.monotonic()
+        self._win_bytes = 0
+        self._win_wait = 0.0
+
+    def claim(self, fair: float) -> float:
+        """本传输占用的带宽：限速等待较多的至少算公平份额，否则按实测速率"""
+        return max(self.rate, fair) if self.starved else self.rate
+
+    def _account(self, now: float, n: int, wait: float):
+        self._win_bytes += n
+        self._win_wait += max(0.0, wait)
+        elapsed = now - self._win_start
+        if elapsed >= STREAM_WINDOW:
+            self.rate = self._win_bytes / elapsed
+            self.starved = self._win_wait > elapsed * STARVE_RATIO
+            self._win_start = now
+            self._win_bytes = 0
+            self._win_wait = 0.0
+
+    def reserve(self, n: int) -> float:
+        return self.limiter._reserve(self, n)
+
+    def consume(self, n: int):
+        wait = self.reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def consume_async(self, n: int):
+        wait = self.reserve(n)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BandwidthLimiter:
+    """全局字节令牌桶 + 按需分配的单传输份额
+
+    单个传输的份额 = max(上限/活跃数, 上限 - 其他传输占用)，
+    其他传输占用按 _Stream.claim 计：跑不满的让出余量，被限住的保留公平份额。
+    """
+
+    def __init__(self, default_rate: float, rules: list):
+        self.default_rate = default_rate
+        self.rules = rules
+        self._lock = threading.Lock()
+        self._streams = set()
+        self._next_time = 0.0
+        self._rate = None
+        self._rate_checked = 0.0
+        self._meter_start = time.monotonic()
+        self._meter_bytes = 0
+        self._measured = 0.0
+        # 累计流过的字节（不受限速开关影响），供自适应并发按窗口计算吞吐
+        self.total_bytes = 0
+
+    def enabled(self) -> bool:
+        return bool(self.default_rate or self.rules)
+
+    def current_rate(self) -> float:
+        """当前时段上限（每 30 秒重新查一次时间表）"""
+        now = time.monotonic()
+        if self._rate is None or now - self._rate_checked > 30:
+            self._rate = rate_at(self.rules, self.default_rate, datetime.now())
+            self._rate_checked = now
+        return self._rate
+
+    def _reserve(self, stream: _Stream, n: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._meter(now, n)
+            rate = self.current_rate()
+            if rate <= 0:
+                return 0.0
+            # 全局：虚拟完成时间，允许 BURST_SECONDS 的突发
+            self._next_time = max(self._next_time, now - BURST_SECONDS) + n / rate
+            wait = self._next_time - now - BURST_SECONDS
+            # 公平且不浪费：至少平均份额，其他传输用不完的也可以用
+            fair = rate / max(1, len(self._streams))
+            others = sum(s.claim(fair) for s in self._streams if s is not stream)
+            share = max(fair, rate - others)
+            stream.next_time = max(stream.next_time, now) + n / share
+            wait = max(wait, stream.next_time - now - BURST_SECONDS)
+            stream._account(now, n, wait)
+            return wait
+
+    def _meter(self, now: float, n: int):
+        self.total_bytes += n
+        self._meter_bytes += n
+        elapsed = now - self._meter_start
+        if elapsed >= METER_WINDOW:
+            self._measured = self._meter_bytes / elapsed
+            self._meter_start = now
+            self._meter_bytes = 0
+
+    @contextmanager
+    def stream(self):
+        """登记一个活跃传输，yield 的对象在每个 chunk 后调用 consume(n)"""
+        s = _Stream(self)
+        with self._lock:
+            self._streams.add(s)
+        try:
+            yield s
+        finally:
+            with self._lock:
+                self._streams.discard(s)
+
+    def measured(self) -> float:
+        """最近窗口的实测吞吐；第一个窗口未结束时用当前累计值"""
+        with self._lock:
+            if self._measured:
+                return self._measured
+            elapsed = time.monotonic() - self._meter_start
+            return self._meter_bytes / elapsed if elapsed > 0 else 0.0
+
+    def format_status(self) -> str:
+        rate = self.current_rate()
+        cap = f"{rate / 1024 / 1024:.2f}MB/s" if rate > 0 else "不限"
+        return (f"带宽 {self.measured() / 1024 / 1024:.2f}MB/s / 上限 {cap}, "
+                f"活跃传输 {len(self._streams)}")
+
+
+limiter = BandwidthLimiter(parse_rate(BANDWIDTH_LIMIT),
+                           parse_schedule(BANDWIDTH_SCHEDULE))
+
+
+def stream():
+    return limiter.stream()
+
+
+def format_status() -> str:
+    return limiter.format_status()
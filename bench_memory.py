@@ -0,0 +1,125 @@
+# File: tools/yike-album/bench_memory.py
+"""内存基准：同样数量的列表条目，用原始 dict 与 MediaItem 保存时的峰值 RSS
+
+用法：python bench_memory.py [条目数 ...]，默认 10000 50000 100000 200000
+每个 (表示方式, 条目数) 在独立子进程中测量，互不影响峰值。
+条目为模拟的列表 API 返回（字段与真实返回同量级），不访问网络。
+"""
+import gc
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_COUNTS = (10000, 50000, 100000, 200000)
+MODES = ("dict", "slots")
+
+
+def fake_item(i: int) -> dict:
+    """模拟一条列表 API 返回"""
+    ts = 1500000000 + i * 37
+    ext = ".mp4" if i % 10 == 0 else ".jpg"
+    return {
+        "fsid": 700000000000000 + i,
+        "path": f"/youa/web/IMG_{i:08d}{ext}",
+        "size": 1500000 + (i * 7919) % 4000000,
+        "md5": f"{i * 2654435761 % (1 << 128):032x}",
+        "shoot_time": ts,
+        "ctime": ts + 60,
+        "mtime": ts + 60,
+        "server_ctime": ts + 120,
+        "server_mtime": ts + 120,
+        "category": 4 if ext == ".mp4" else 3,
+        "isdir": 0,
+        "thumburl": [f"https://thumbnail0.baidupcs.com/thumbnail/{i:x}?size=c{s}"
+                     for s in (140, 360, 850)],
+        "extra_info": {
+            "date_time": time.strftime("%Y:%m:%d %H:%M:%S", time.localtime(ts)),
+            "height": 3024, "width": 4032, "orientation": 1,
+            "model": "iPhone 12", "longitude": 0.0, "latitude": 0.0,
+        },
+    }
+
+
+def peak_rss() -> int:
+    """当前进程的峰值常驻内存（字节）"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def child(mode: str, count: int):
+    """子进程：按页生成条目并全部留在内存中，输出峰值 RSS"""
+    from records import MediaItem
+    gc.collect()
+    base = peak_rss()
+    items = []
+    for start in range(0, count, 100):
+        page = [fake_item(i) for i in range(start, min(start + 100, count))]
+        if mode == "slots":
+            items.extend(MediaItem.from_api(p) for p in page)
+        else:
+            items.extend(page)
+    # 文件名按需生成，确认两种表示都能得到同样的结果
+    sample = items[count // 2]
+    name = sample.filename if mode == "slots" else None
+    print(f"{peak_rss()} {base} {name or ''}")
+
+
+def measure(mode: str, count: int) -> tuple:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, str(count)],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout.split()
+    return int(out[0]), int(out[1])
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ["--child"]:
+        child(args[1], int(args[2]))
+        return
+    counts = [int(a) for a in args] or DEFAULT_COUNTS
+    print("=" * 64)
+    print("  列表条目内存基准（峰值 RSS，MB）")
+    print("=" * 64)
+    print(f"{'条目数':>10} {'dict':>10} {'MediaItem':>10} {'节省':>8} "
+          f"{'每条 dict':>10} {'每条 slots':>10}")
+    for count in counts:
+        row = {}
+        for mode in MODES:
+            peak, base = measure(mode, count)
+            row[mode] = (peak, peak - base)
+        d, s = row["dict"], row["slots"]
+        saved = 1 - s[1] / d[1] if d[1] else 0.0
+        print(f"{count:>10,} {d[0] / 1024 / 1024:>10.1f} "
+              f"{s[0] / 1024 / 1024:>10.1f} {saved:>8.0%} "
+              f"{d[1] / count:>9.0f}B {s[1] / count:>9.0f}B")
+
+
+if __name__ == "__main__":
+    main()
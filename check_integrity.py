@@ -1,91 +1,342 @@
 # File: tools/yike-album/check_integrity.py
-"""完整性核对：对比API数据和本地文件"""
+"""完整性核对：按 fsid 把状态库中的列表元数据与下载目录逐条对账
+
+文件名末尾带 fsid（records.format_filename），一次目录扫描（fileindex，
+网络盘上并行 stat）之后按 fsid 连接，逐条列出：
+- missing   列表中有、本地没有
+- truncated 本地文件比列表大小小
+- oversized 本地文件比列表大小大
+- corrupt   大小一致，但下载时记录的校验和与云端 md5 不符
+- orphaned  本地有、列表中没有（云端已删除、文件名认不出 fsid、同一 fsid 的多余文件）
+有问题的条目写回状态库（missing / mismatch），并输出机器可读报告
+_audit_report.json，其中 queue 为需要重下的 fsid，
+python download.py --queue 直接按它补下载。
+
+默认只比对大小和库中的校验和，不读文件内容。加 --verify 重读内容：
+状态库按文件记录大小、mtime、校验和与校验时间（下载时算出的校验和即
+第一次校验），大小和 mtime 都没变的文件跳过，只重读变过的、从未校验过的，
+外加按校验时间从旧到新滚动抽查 VERIFY_SAMPLE 比例，发现静默损坏。
+加 --decode 用进程池把每张照片完整解码一遍（imagecheck.py），
+并检查每个视频的容器结构（videocheck.py，只读 box 头）。
+"""
 import json
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from config import DOWNLOAD_DIR
+
+import checksum
+import fileindex
+import state
+from config import (
+    AUDIT_REPORT_FILE, DOWNLOAD_DIR, VERIFY_SAMPLE, VERIFY_WORKERS,
+)
+from records import parse_fsid
+
+REPORT_VERSION = 1
+PROBLEMS = ("missing", "truncated", "oversized", "corrupt")
+
+
+def _kind(row: dict) -> str:
+    return "video" if state.is_video(row) else "photo"
+
+
+def audit(rows: dict = None, files: dict = None, kind: str = None) -> dict:
+    """对账，返回报告 dict（只读，不改动文件和状态库）
+
+    rows 为 fsid → 状态库行，缺省取 state.store.meta()；
+    files 为 文件名 → (大小, mtime)，缺省取目录索引；
+    kind 为 "photo" / "video" 时只核对该类型。
+    续传/临时文件单独列在 partial，不参与对账。
+    """
+    if rows is None:
+        rows = state.store.meta()
+    if files is None:
+        files = fileindex.index.files()
+    report = {key: [] for key in ("ok",) + PROBLEMS + ("orphaned", "partial")}
+    report["partial"] = [{"name": name, "size": size} for name, (size, _)
+                         in fileindex.index.partial_files().items()]
+    by_fsid = {}
+    for name, (size, _) in files.items():
+        if name.endswith(fileindex.PARTIAL_SUFFIXES):
+            continue
+        if kind and _kind({"name": name}) != kind:
+            continue
+        fsid = parse_fsid(name)
+        if fsid is None:
+            report["orphaned"].append(
+                {"fsid": None, "name": name, "size": size, "reason": "unnamed"})
+            continue
+        by_fsid.setdefault(fsid, []).append(name)
+
+    for fsid, row in rows.items():
+        if kind and _kind(row) != kind:
+            continue
+        names = by_fsid.pop(fsid, [])
+        expected = row["size"] or 0
+        if not names:
+            report["missing"].append(
+                {"fsid": fsid, "name": row["name"], "expected": expected})
+            continue
+        # 同一 fsid 有多个文件（如 EXIF 时间变化后重新命名）时以状态库记录为准
+        name = row["name"] if row["name"] in names else names[0]
+        for extra in names:
+            if extra != name:
+                report["orphaned"].append(
+                    {"fsid": fsid, "name": extra, "size": files[extra][0],
+                     "reason": "duplicate"})
+        actual = files[name][0]
+        entry = {"fsid": fsid, "name": name, "expected": expected,
+                 "actual": actual}
+        if expected and actual < expected:
+            report["truncated"].append(entry)
+        elif expected and actual > expected:
+            report["oversized"].append(entry)
+        elif checksum.verify(row["md5"], row["checksum"]):
+            entry.update(md5=row["md5"], checksum=row["checksum"])
+            report["corrupt"].append(entry)
+        else:
+            report["ok"].append(entry)
+
+    for fsid, names in by_fsid.items():
+        for name in names:
+            report["orphaned"].append(
+                {"fsid": fsid, "name": name, "size": files[name][0],
+                 "reason": "unlisted"})
+
+    report["queue"] = [e["fsid"] for key in PROBLEMS for e in report[key]]
+    report["summary"] = {key: len(report[key])
+                         for key in ("ok",) + PROBLEMS + ("orphaned", "partial")}
+    report.update(version=REPORT_VERSION, kind=kind or "all",
+                  generated_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+                  download_dir=str(DOWNLOAD_DIR),
+                  listing_error=state.store.listing_error())
+    return report
+
+
+def _cached(row: dict, actual: int, mtime: float) -> bool:
+    """上次校验之后文件大小与 mtime 都没变"""
+    return bool(row.get("verified_at") and row["checksum"]) and \
+        row["bytes"] == actual and row.get("verified_mtime") == mtime
+
+
+def _rehash(path: Path, row: dict):
+    """重读整个文件算校验和，返回 (校验和, 问题或 None)；文件读不了返回 (None, 原因)"""
+    algo = "md5" if row["md5"] or (row["checksum"] or "").startswith("md5:") \
+        else "b2"
+    try:
+        digest = checksum.file_digest(path, algo)
+    except OSError as e:
+        return None, f"读取失败: {e}"
+    problem = checksum.verify(row["md5"], digest)
+    if not problem and row["checksum"] and row["checksum"] != digest and \
+            row["checksum"].split(":", 1)[0] == digest.split(":", 1)[0]:
+        problem = f"内容已变化: 校验和 {digest} 记录为 {row['checksum']}"
+    return digest, problem
+
+
+def verify_content(report: dict, rows: dict, files: dict,
+                   sample: float = VERIFY_SAMPLE,
+                   workers: int = VERIFY_WORKERS) -> dict:
+    """重读大小正常（report["ok"]）的文件内容，结果并入 report
+
+    大小+mtime 未变且校验过的走缓存；其余全部重读，另按 verified_at 从旧到新
+    抽 sample 比例的缓存条目重读。内容不符的移到 corrupt 并加入 queue，
+    通过的写回校验缓存。返回统计：hashed / cached / sampled / bytes / seconds。
+    """
+    start = time.monotonic()
+    todo, cached = [], []
+    for e in report["ok"]:
+        row = rows[e["fsid"]]
+        mtime = files[e["name"]][1]
+        (cached if _cached(row, e["actual"], mtime) else todo).append(e)
+    n_sample = math.ceil(len(cached) * sample) if sample > 0 else 0
+    cached.sort(key=lambda e: rows[e["fsid"]]["verified_at"])
+    sampled = cached[:n_sample]
+    todo += sampled
+
+    def check(e):
+        return _rehash(DOWNLOAD_DIR / e["name"], rows[e["fsid"]])
+
+    with ThreadPoolExecutor(max(1, workers),
+                            thread_name_prefix="verify") as pool:
+        results = list(pool.map(check, todo))
+
+    verified, bad, nbytes = [], set(), 0
+    for e, (digest, problem) in zip(todo, results):
+        if digest is None:
+            print(f"  [跳过] {e['name']}: {problem}")
+            continue
+        nbytes += e["actual"]
+        if problem:
+            row = rows[e["fsid"]]
+            report["corrupt"].append(dict(e, md5=row["md5"], checksum=digest))
+            report["queue"].append(e["fsid"])
+            bad.add(e["fsid"])
+        else:
+            verified.append((e["fsid"], e["actual"], files[e["name"]][1],
+                             digest))
+    report["ok"] = [e for e in report["ok"] if e["fsid"] not in bad]
+    report["summary"].update(ok=len(report["ok"]),
+                             corrupt=len(report["corrupt"]))
+    state.store.set_verified(verified)
+    stats = {"hashed": len(todo), "cached": len(cached) - len(sampled),
+             "sampled": len(sampled), "bytes": nbytes,
+             "seconds": round(time.monotonic() - start, 1)}
+    report["verify"] = stats
+    return stats
+
+
+def cache_coverage(report: dict, rows: dict, files: dict) -> int:
+    """大小正常的文件中，校验缓存仍然有效的个数（不读文件）"""
+    return sum(1 for e in report["ok"]
+               if _cached(rows[e["fsid"]], e["actual"], files[e["name"]][1]))
+
+
+def apply(report: dict):
+    """核对结果写回状态库：正常的记为 done，缺失/大小或内容不符的供下次重下"""
+    updates = [(e["fsid"], state.DONE, None) for e in report["ok"]]
+    updates += [(e["fsid"], state.MISSING, None) for e in report["missing"]]
+    updates += [(e["fsid"], state.MISMATCH, e["actual"])
+                for key in ("truncated", "oversized", "corrupt")
+                for e in report[key]]
+    state.store.set_status(updates)
+
+
+def save_report(report: dict, path: Path = AUDIT_REPORT_FILE):
+    """写出机器可读报告（不含正常条目的 fsid 列表），先写临时文件再替换"""
+    head = ("version", "kind", "generated_at", "download_dir",
+            "listing_error", "summary", "verify", "decode", "containers",
+            "queue")
+    for key in ("verify", "decode", "containers"):
+        report.setdefault(key, None)
+    data = {k: report[k] for k in head}
+    data.update((k, v) for k, v in report.items()
+                if k not in head and k != "ok")
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1),
+                   encoding="utf-8")
+    tmp.replace(path)
+
+
+def load_report(path: Path = AUDIT_REPORT_FILE) -> dict:
+    """读取报告；不存在或版本不符返回 None"""
+    if not path.exists():
+        return None
+    try:
+        report = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return report if report.get("version") == REPORT_VERSION else None
+
+
+def print_problems(report: dict, limit: int = 10):
+    labels = {"missing": "缺失", "truncated": "偏小", "oversized": "偏大",
+              "corrupt": "内容不符", "orphaned": "孤立"}
+    for key, label in labels.items():
+        entries = report[key]
+        for e in entries[:limit]:
+            if key == "missing":
+                detail = f"期望{e['expected']:,}"
+            elif key == "corrupt" and "error" in e:
+                detail = e["error"]
+            elif key == "corrupt":
+                detail = f"校验和 {e['checksum']} 云端 md5 {e['md5']}"
+            elif key == "orphaned":
+                detail = f"{e['size']:,}B, {e['reason']}"
+            else:
+                detail = f"期望{e['expected']:,} 实际{e['actual']:,}"
+            print(f"  [{label}] {e['name'] or e['fsid']}: {detail}")
+        if len(entries) > limit:
+            print(f"  [{label}] ... 共 {len(entries):,} 个")
+
+
+def print_verify(report: dict, rows: dict, files: dict):
+    v = report.get("verify")
+    if v is None:
+        print(f"  校验缓存: {cache_coverage(report, rows, files):,}"
+              f"/{len(report['ok']):,} 个文件内容已校验且未变动"
+              f"（--verify 重读其余文件）")
+        return
+    print(f"  重读校验: {v['hashed']:,} 个（其中滚动抽查 {v['sampled']:,}），"
+          f"缓存跳过 {v['cached']:,} 个，实际读取 "
+          f"{v['bytes'] / 1024 / 1024:.1f}MB，用时 {v['seconds']}s")
+
 
 def main():
     print("=" * 70)
-    print("  一刻相册下载完整性核对")
+    print("  一刻相册下载完整性核对（按 fsid 对账）")
     print("=" * 70)
-    
-    meta_file = DOWNLOAD_DIR / "_photo_meta.json"
-    if not meta_file.exists():
-        print(f"\n[错误] 未找到元数据文件: {meta_file}")
+
+    rows = state.store.meta()
+    if not rows:
+        print(f"\n[错误] 状态库中没有元数据: {state.store.path}")
+        state.store.close()
         return
-    
-    meta_data = json.loads(meta_file.read_text(encoding="utf-8"))
-    print(f"\nAPI返回总数: {len(meta_data):,} 个文件")
-    
-    video_exts = {'.mp4', '.mov', '.avi', '.mkv', '.m4v'}
-    api_photos = []
-    api_videos = []
-    
-    for item in meta_data:
-        path = item.get('path', '')
-        ext = Path(path).suffix.lower()
-        if ext in video_exts:
-            api_videos.append(item)
-        else:
-            api_photos.append(item)
-    
-    print(f"  - 照片: {len(api_photos):,} 张")
-    print(f"  - 视频: {len(api_videos):,} 个")
-    
     if not DOWNLOAD_DIR.exists():
         print(f"\n[错误] 下载目录不存在: {DOWNLOAD_DIR}")
+        state.store.close()
         return
-    
-    local_files = [f for f in DOWNLOAD_DIR.glob('*') 
-                   if f.is_file() and not f.name.startswith('_')]
-    
-    print(f"\n本地文件总数: {len(local_files):,} 个")
-    
-    photo_exts = {'.jpg', '.jpeg', '.png', '.heic', '.gif', '.bmp', '.webp', '.heif'}
-    local_photos = [f for f in local_files if f.suffix.lower() in photo_exts]
-    local_videos = [f for f in local_files if f.suffix.lower() in video_exts]
-    local_other = [f for f in local_files 
-                   if f.suffix.lower() not in photo_exts 
-                   and f.suffix.lower() not in video_exts]
-    
-    print(f"  - 照片: {len(local_photos):,} 张")
-    print(f"  - 视频: {len(local_videos):,} 个")
-    if local_other:
-        print(f"  - 其他: {len(local_other):,} 个")
-        ext_counts = {}
-        for f in local_other:
-            ext = f.suffix.lower()
-            ext_counts[ext] = ext_counts.get(ext, 0) + 1
-        for ext, count in sorted(ext_counts.items()):
-            print(f"      {ext}: {count:,} 个")
-    
+
+    videos = sum(1 for r in rows.values() if state.is_video(r))
+    print(f"\nAPI返回总数: {len(rows):,} 个文件")
+    print(f"  - 照片: {len(rows) - videos:,} 张")
+    print(f"  - 视频: {videos:,} 个")
+
+    start = time.monotonic()
+    files = fileindex.index.files()
+    print(f"\n本地文件总数: {len(files):,} 个 "
+          f"（目录扫描 {time.monotonic() - start:.1f}s）")
+
+    report = audit(rows, files)
+    if report["listing_error"]:
+        print(f"  ⚠ 最近一次列表同步未完成（{report['listing_error']}），"
+              f"API 总数只是部分图库，缺失数不可信，请重新运行 download.py 续拉")
+
     print(f"\n{'=' * 70}")
-    print("  数量对比")
-    print(f"{'=' * 70}")
-    
-    photo_diff = len(local_photos) - len(api_photos)
-    video_diff = len(local_videos) - len(api_videos)
-    total_diff = len(local_files) - len(meta_data)
-    
-    print(f"\n照片: API {len(api_photos):,} vs 本地 {len(local_photos):,} "
-          f"(差异: {photo_diff:+,})")
-    print(f"视频: API {len(api_videos):,} vs 本地 {len(local_videos):,} "
-          f"(差异: {video_diff:+,})")
-    print(f"总计: API {len(meta_data):,} vs 本地 {len(local_files):,} "
-          f"(差异: {total_diff:+,})")
-    
+    print("  逐条对账")
+    print(f"{'=' * 70}\n")
+    if "--verify" in sys.argv[1:]:
+        verify_content(report, rows, files)
+    if "--decode" in sys.argv[1:]:
+        import imagecheck
+        import videocheck
+        imagecheck.validate(report, rows, files)
+        videocheck.validate(report, rows, files)
+    print_problems(report)
+
+    s = report["summary"]
+    print(f"\n  正常:     {s['ok']:,}")
+    print(f"  缺失:     {s['missing']:,}")
+    print(f"  偏小:     {s['truncated']:,}")
+    print(f"  偏大:     {s['oversized']:,}")
+    print(f"  内容不符: {s['corrupt']:,}")
+    print(f"  孤立文件: {s['orphaned']:,}")
+    if s["partial"]:
+        print(f"  未完成的续传文件: {s['partial']:,}")
+    print_verify(report, rows, files)
+    if report.get("decode"):
+        import imagecheck
+        print(f"  解码校验: {imagecheck.format_stats(report['decode'])}")
+    if report.get("containers"):
+        import videocheck
+        print(f"  视频容器: {videocheck.format_stats(report['containers'])}")
+
+    apply(report)
+    save_report(report)
+    state.store.close()
+
     print(f"\n{'=' * 70}")
-    if total_diff == 0:
-        print("  ✓ 数量完全一致！")
-    elif total_diff > 0:
-        print(f"  ⚠ 本地文件比API多 {total_diff:,} 个")
-        if local_other:
-            print(f"     可能原因: 包含 {len(local_other):,} 个特殊格式文件")
+    if report["queue"]:
+        print(f"  ✗ {len(report['queue']):,} 个条目需要重新下载，"
+              f"已写入状态库与报告")
+        print("     python download.py --queue  按报告补下载")
     else:
-        print(f"  ✗ 本地文件比API少 {-total_diff:,} 个，可能有文件未下载")
-    
-    total_size = sum(f.stat().st_size for f in local_files)
+        print("  ✓ 所有条目与列表一致！")
+    total_size = sum(size for size, _ in files.values())
     print(f"\n本地文件总大小: {total_size / 1024 / 1024 / 1024:.2f} GB")
+    print(f"核对报告: {AUDIT_REPORT_FILE}")
     print(f"保存位置: {DOWNLOAD_DIR}")
     print("=" * 70)
 
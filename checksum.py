@@ -0,0 +1,80 @@
+# File: tools/yike-album/checksum.py
+"""下载时顺带计算的内容校验和
+
+列表 API 给了 md5 的条目在 iter_bytes 循环里同步算 MD5，写完即与云端比对；
+没有 md5 的算 BLAKE2b（更快），只记录不比对。结果以 "md5:<hex>" /
+"b2:<hex>" 写入状态库 checksum 列，之后校验直接查库，不必重读文件。
+分段并行下载的字节乱序到达，无法边下边算，写完后整文件读一遍补算。
+"""
+import hashlib
+from pathlib import Path
+
+from config import VERIFY_MD5
+
+READ_CHUNK = 1024 * 1024
+
+
+class StreamDigest:
+    """增量摘要；重新从头下载时 reset()，字节乱序写入时 invalidate()"""
+
+    def __init__(self, algo: str):
+        self.algo = algo
+        self.reset()
+
+    def reset(self):
+        self._h = hashlib.md5() if self.algo == "md5" \
+            else hashlib.blake2b(digest_size=16)
+        self.valid = True
+
+    def update(self, chunk: bytes):
+        self._h.update(chunk)
+
+    def invalidate(self):
+        self.valid = False
+
+    def feed_file(self, path: Path, limit: int = None):
+        """从磁盘补喂已有内容（续传时 .part 里的前缀）"""
+        left = limit
+        with open(path, "rb") as f:
+            while left is None or left > 0:
+                chunk = f.read(READ_CHUNK if left is None
+                               else min(READ_CHUNK, left))
+                if not chunk:
+                    break
+                self._h.update(chunk)
+                if left is not None:
+                    left -= len(chunk)
+
+    def format(self) -> str:
+        prefix = "md5" if self.algo == "md5" else "b2"
+        return f"{prefix}:{self._h.hexdigest()}"
+
+
+def for_item(item) -> StreamDigest:
+    """列表带 md5 的用 MD5（可与云端比对），否则用 BLAKE2"""
+    return StreamDigest("md5" if item.md5 else "b2")
+
+
+def file_digest(path: Path, algo: str = "b2") -> str:
+    """整文件摘要（分段下载或历史文件补算时用）"""
+    digest = StreamDigest(algo)
+    digest.feed_file(path)
+    return digest.format()
+
+
+def finish(digest: StreamDigest, path: Path) -> str:
+    """下载结束时取摘要；边下边算的结果无效时读文件补算"""
+    if digest.valid:
+        return digest.format()
+    return file_digest(path, digest.algo)
+
+
+def verify(md5: str, checksum: str):
+    """与云端 md5 比对，不一致返回原因，否则返回 None"""
+    if not VERIFY_MD5 or not md5 or not checksum \
+            or not checksum.startswith("md5:"):
+        return None
+    actual = checksum[4:]
+    if actual != md5.lower():
+        return f"md5不符: 下载{actual} 期望{md5}"
+    return None
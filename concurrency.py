@@ -0,0 +1,266 @@
+# File: tools/yike-album/concurrency.py
+"""AIMD 自适应并发：吞吐上升就 +1，出现错误/超时/延迟飙升就乘性回退
+
+照片和视频混在同一个池里，单个文件的耗时相差上百倍，不能直接比较：
+延迟按字节归一成 秒/MB，并按文件大小分档各自维护基线，
+只有同一档的文件变慢才算延迟飙升。吞吐取带宽计量器上实际流过的字节，
+大视频传输中的字节也计入当前窗口，不会等到文件完成时才一次性算进来。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+import bandwidth
+from config import (
+    CONCURRENT_DOWNLOADS, ADAPTIVE_CONCURRENCY,
+    ADAPTIVE_MIN, ADAPTIVE_MAX, ADAPTIVE_WINDOW,
+)
+
+# 吞吐至少提升 5% 才算"还在变好"
+IMPROVE_RATIO = 1.05
+# 乘性回退系数
+BACKOFF = 0.7
+# 某一档的 秒/MB 超过该档基线这么多倍视为延迟飙升
+LATENCY_SPIKE = 2.5
+MB = 1024 * 1024
+# 文件大小分档的上界（每档 4 倍）：同一档内固定开销占比相近，秒/MB 可比
+SIZE_CLASSES = (1 * MB, 4 * MB, 16 * MB, 64 * MB, 256 * MB)
+
+
+def size_class(nbytes: int) -> int:
+    return bisect.bisect_right(SIZE_CLASSES, nbytes)
+
+
+class AdaptiveLimiter:
+    """在途传输数上限随观测结果调整，floor ≤ limit ≤ ceiling
+
+    byte_counter() 返回累计传输字节数，用来算窗口吞吐；
+    缺省为 None 时按完成的名额上报的字节计。
+    """
+
+    def __init__(self, initial: int, floor: int, ceiling: int,
+                 window: float, tag: str = "[并发]", byte_counter=None):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = float(min(max(initial, self.floor), self.ceiling))
+        self.window = window
+        self.tag = tag
+        self.byte_counter = byte_counter
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._reset_window()
+        self._prev_rate = None
+        # 大小档 → 基线 秒/MB
+        self._baselines = {}
+        self.decisions = 0
+
+    def _reset_window(self):
+        self._win_start = time.monotonic()
+        self._win_bytes = 0
+        self._win_counter = self.byte_counter() if self.byte_counter else 0
+        self._win_done = 0
+        self._win_errors = 0
+        self._win_latency = 0.0
+        # 大小档 → [耗时合计, 字节合计]
+        self._win_classes = {}
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, nbytes: int = 0):
+        with self._cond:
+            self.in_flight -= 1
+            self._win_done += 1
+            self._win_bytes += nbytes
+            self._win_latency += latency
+            if nbytes > 0:
+                acc = self._win_classes.setdefault(size_class(nbytes), [0.0, 0])
+                acc[0] += latency
+                acc[1] += nbytes
+            self._maybe_adjust()
+            self._cond.notify_all()
+
+    def error(self, kind: str):
+        """记录一次拥塞信号（API errno、超时、传输异常）"""
+        with self._cond:
+            self._win_errors += 1
+
+    def try_extra(self) -> bool:
+        """不等待地多占一个名额（分段下载的额外连接），占不到返回 False"""
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release_extra(self):
+        """归还 try_extra 占的名额；字节与耗时由该文件的主名额统计"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """占用一个传输名额，yield 一个 dict，调用方可填入 bytes"""
+        self.acquire()
+        start = time.monotonic()
+        info = {"bytes": 0}
+        try:
+            yield info
+        except Exception as e:
+            kind = congestion_kind(e)
+            if kind:
+                self.error(kind)
+            raise
+        finally:
+            self.release(time.monotonic() - start, info["bytes"])
+
+    def _spike(self, per_mb: dict):
+        """同档比较：返回 (档, 秒/MB, 基线) 中超出基线最多的一个，没有飙升返回 None"""
+        worst = None
+        for cls, value in per_mb.items():
+            base = self._baselines.get(cls)
+            if base and value > base * LATENCY_SPIKE and \
+                    (worst is None or value / base > worst[1] / worst[2]):
+                worst = (cls, value, base)
+        return worst
+
+    def _maybe_adjust(self):
+        elapsed = time.monotonic() - self._win_start
+        if elapsed < self.window or not self._win_done:
+            return
+        if self.byte_counter:
+            rate = (self.byte_counter() - self._win_counter) / elapsed
+        else:
+            rate = self._win_bytes / elapsed
+        latency = self._win_latency / self._win_done
+        per_mb = {cls: seconds / (nbytes / MB)
+                  for cls, (seconds, nbytes) in self._win_classes.items()}
+        errors = self._win_errors
+        spike = None if errors else self._spike(per_mb)
+        old = self.limit
+        if errors:
+            self.limit = max(self.floor, self.limit * BACKOFF)
+            reason = f"错误 {errors} 次，回退"
+        elif spike:
+            self.limit = max(self.floor, self.limit * BACKOFF)
+            cls, value, base = spike
+            reason = (f"第 {cls} 档延迟 {value:.3f}s/MB > 基线 "
+                      f"{base:.3f}s/MB×{LATENCY_SPIKE}，回退")
+        elif self._prev_rate is None or rate > self._prev_rate * IMPROVE_RATIO:
+            self.limit = min(self.ceiling, self.limit + 1)
+            reason = "吞吐提升，加 1"
+        else:
+            reason = "吞吐持平，保持"
+        if not errors:
+            for cls, value in per_mb.items():
+                base = self._baselines.get(cls)
+                self._baselines[cls] = value if base is None \
+                    else base * 0.8 + value * 0.2
+        self._prev_rate = rate
+        self.decisions += 1
+        print(f"{self.tag} 吞吐 {rate / 1024 / 1024:.2f}MB/s "
+              f"完成 {self._win_done} 平均耗时 {latency:.2f}s: "
+              f"{reason} {int(old)} → {int(self.limit)}")
+        self._reset_window()
+
+
+class FixedLimiter:
+    """固定名额的传输闸门，接口与 AdaptiveLimiter 相同"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._sem = threading.Semaphore(limit)
+
+    def error(self, kind: str):
+        pass
+
+    def try_extra(self) -> bool:
+        return self._sem.acquire(blocking=False)
+
+    def release_extra(self):
+        self._sem.release()
+
+    @contextmanager
+    def slot(self):
+        self._sem.acquire()
+        try:
+            yield {"bytes": 0}
+        finally:
+            self._sem.release()
+
+
+# 当前生效的传输闸门；引擎未启动时为 None，signal_error 直接忽略
+controller = None
+
+
+def max_transfers() -> int:
+    """同时传输字节的上限：自适应模式取 ADAPTIVE_MAX"""
+    return ADAPTIVE_MAX if ADAPTIVE_CONCURRENCY else CONCURRENT_DOWNLOADS
+
+
+def start(tag: str):
+    """启动传输闸门：YIKE_ADAPTIVE=1 用 AIMD，否则固定 CONCURRENT_DOWNLOADS"""
+    global controller
+    if not ADAPTIVE_CONCURRENCY:
+        controller = FixedLimiter(CONCURRENT_DOWNLOADS)
+        return controller
+    controller = AdaptiveLimiter(
+        CONCURRENT_DOWNLOADS, ADAPTIVE_MIN, ADAPTIVE_MAX, ADAPTIVE_WINDOW, tag,
+        byte_counter=lambda: bandwidth.limiter.total_bytes,
+    )
+    print(f"{tag} 自适应并发: 初始 {int(controller.limit)}, "
+          f"范围 {controller.floor}-{controller.ceiling}")
+    return controller
+
+
+def stop():
+    global controller
+    controller = None
+
+
+# 引擎未启动时（retry_failed.py 这类逐个下载的脚本）分段额外连接用的名额，
+# 调用线程自己的连接占掉一个
+_standalone = None
+_standalone_lock = threading.Lock()
+
+
+def lane_limiter():
+    """分段下载的额外连接与整文件传输共用当前闸门；引擎未启动时用固定名额兜底"""
+    global _standalone
+    if controller is not None:
+        return controller
+    with _standalone_lock:
+        if _standalone is None:
+            _standalone = FixedLimiter(max(0, max_transfers() - 1))
+        return _standalone
+
+
+def signal_error(kind: str):
+    if controller is not None:
+        controller.error(kind)
+
+
+def congestion_kind(exc: Exception):
+    """超时、网络错误、429/5xx 视为拥塞信号，其余返回 None"""
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError):
+        if exc.response.status_code in (429, 500, 502, 503, 504):
+            return "http"
+        return None
+    if isinstance(exc, httpx.TransportError):
+        return "transport"
+    return None
+
+
+def signal_exception(exc: Exception):
+    kind = congestion_kind(exc)
+    if kind:
+        signal_error(kind)
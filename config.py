@@ -9,12 +9,95 @@ DOWNLOAD_DIR = Path(os.environ.get(
 ORGANIZED_DIR = Path(os.environ.get(
     "YIKE_ORGANIZED_DIR", r"E:\照片_整理"
 ))
+# 整理方式：auto(默认，硬链接 → reflink → 复制) / hardlink / reflink / copy / rename
+ORGANIZE_MODE = os.environ.get("YIKE_ORGANIZE_MODE", "auto")
+ORGANIZE_WORKERS = int(os.environ.get("YIKE_ORGANIZE_WORKERS", "8"))
 CONCURRENT_DOWNLOADS = int(os.environ.get("YIKE_CONCURRENT", "15"))
 DOWNLOAD_TIMEOUT = int(os.environ.get("YIKE_TIMEOUT", "180"))
+# 旧的逐线程请求间隔，已由下方 API 令牌桶取代，仅为兼容保留
 REQUEST_DELAY = float(os.environ.get("YIKE_DELAY", "0.2"))
+# 连接池：全局长连接上限（默认每个并发槽位 API + CDN 各一条）、空闲保活时间(秒)
+POOL_MAX_CONNECTIONS = int(os.environ.get(
+    "YIKE_POOL_MAX", str(CONCURRENT_DOWNLOADS * 2)
+))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("YIKE_POOL_KEEPALIVE", "60"))
+# 下载引擎：thread = 线程池（默认），async = 单事件循环 + httpx.AsyncClient，
+# pipeline = 解析 dlink 与传输字节分成两级线程池
+DOWNLOAD_ENGINE = os.environ.get("YIKE_ENGINE", "thread").lower()
+ASYNC_CONCURRENCY = int(os.environ.get(
+    "YIKE_ASYNC_CONCURRENT", str(CONCURRENT_DOWNLOADS)
+))
+RESOLVE_WORKERS = int(os.environ.get("YIKE_RESOLVERS", "2"))
+RESOLVE_QUEUE_SIZE = int(os.environ.get(
+    "YIKE_RESOLVE_QUEUE", str(CONCURRENT_DOWNLOADS * 4)
+))
+# API 令牌桶：列表与下载链接请求全进程共享，每秒 YIKE_API_RATE 次，突发 YIKE_API_BURST
+API_RATE = float(os.environ.get("YIKE_API_RATE", "15"))
+API_BURST = int(os.environ.get("YIKE_API_BURST", "30"))
+# 全局带宽上限(字节/秒，支持 K/M/G，0 或空为不限)与按时段的上限表
+BANDWIDTH_LIMIT = os.environ.get("YIKE_BANDWIDTH", "0")
+BANDWIDTH_SCHEDULE = os.environ.get("YIKE_BANDWIDTH_SCHEDULE", "")
+# 自适应并发（AIMD）：YIKE_ADAPTIVE=1 启用，在 [MIN, MAX] 间按窗口(秒)调整
+ADAPTIVE_CONCURRENCY = os.environ.get("YIKE_ADAPTIVE", "0") == "1"
+ADAPTIVE_MIN = int(os.environ.get("YIKE_ADAPTIVE_MIN", "2"))
+ADAPTIVE_MAX = int(os.environ.get(
+    "YIKE_ADAPTIVE_MAX", str(CONCURRENT_DOWNLOADS * 3)
+))
+ADAPTIVE_WINDOW = float(os.environ.get("YIKE_ADAPTIVE_WINDOW", "10"))
+# 内容去重：YIKE_DEDUP=1 启用，相同内容（不同 fsid）只下载一次，其余用硬链接
+DEDUP_ENABLED = os.environ.get("YIKE_DEDUP", "0") == "1"
+# 下载时边收边算校验和；列表带 md5 的写完即比对，不符按下载失败处理（YIKE_VERIFY_MD5=0 只记录不比对）
+VERIFY_MD5 = os.environ.get("YIKE_VERIFY_MD5", "1") == "1"
+# 大文件分段下载：超过阈值按每段 SEGMENT_SIZE 切分，最多 SEGMENT_MAX 段
+SEGMENT_THRESHOLD = int(os.environ.get(
+    "YIKE_SEGMENT_THRESHOLD", str(64 * 1024 * 1024)
+))
+SEGMENT_SIZE = int(os.environ.get("YIKE_SEGMENT_SIZE", str(32 * 1024 * 1024)))
+SEGMENT_MAX = int(os.environ.get("YIKE_SEGMENT_MAX", "8"))
+# 列表同步：incremental(默认，翻到整页都是已知条目即停) / full(总是全量)
+SYNC_MODE = os.environ.get("YIKE_SYNC", "incremental")
+# 距上次全量扫描超过这么多天自动全量一次，用于发现云端删除与修改
+FULL_RESCAN_DAYS = float(os.environ.get("YIKE_FULL_RESCAN_DAYS", "7"))
+# 列表翻页遇到临时错误（errno/HTTP/网络）时重试次数，间隔从 LIST_RETRY_DELAY 秒起翻倍
+LIST_RETRIES = int(os.environ.get("YIKE_LIST_RETRIES", "5"))
+LIST_RETRY_DELAY = float(os.environ.get("YIKE_LIST_RETRY_DELAY", "2"))
+# 任务调度策略：fifo(列表顺序) / largest(从大到小) / lanes(大小文件分通道)
+SCHEDULE_POLICY = os.environ.get("YIKE_SCHEDULE", "largest")
+# lanes 策略：不小于阈值的算大文件，大文件通道最多占 LANE_BIG_WORKERS 个线程
+LANE_THRESHOLD = int(os.environ.get(
+    "YIKE_LANE_THRESHOLD", str(20 * 1024 * 1024)
+))
+LANE_BIG_WORKERS = int(os.environ.get(
+    "YIKE_LANE_BIG_WORKERS", str(max(1, CONCURRENT_DOWNLOADS // 2))
+))
 
 PROBE_RESULT_FILE = Path(__file__).parent / "probe_result.json"
 PROGRESS_FILE = Path(__file__).parent / "download_progress.json"
+# 下载状态库：sqlite(默认) 或 json(快照+追加日志)；上面的 JSON 进度文件仅用于首次导入
+STATE_BACKEND = os.environ.get("YIKE_STATE_BACKEND", "sqlite")
+STATE_DB = DOWNLOAD_DIR / "_state.db"
+STATE_SNAPSHOT = DOWNLOAD_DIR / "_state.json"
+STATE_JOURNAL = DOWNLOAD_DIR / "_state.journal"
+# 后台写线程最多攒这么久(秒)写一批，崩溃最多丢失这段时间内的记录
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get("YIKE_JOURNAL_FLUSH", "1"))
+# dlink 缓存：直链约 8 小时有效，默认按 7 小时过期留出余量
+# （保存在状态库中，旧版 JSON 缓存文件仅用于首次导入）
+DLINK_CACHE_FILE = DOWNLOAD_DIR / "_dlink_cache.json"
+DLINK_TTL = float(os.environ.get("YIKE_DLINK_TTL", str(7 * 3600)))
+# 完整性核对报告：check_integrity.py 生成，python download.py --queue 按其中的 queue 补下载
+AUDIT_REPORT_FILE = DOWNLOAD_DIR / "_audit_report.json"
+# 扫描下载目录时并行 stat 的线程数（网络盘上每次 stat 都是一次往返），1 为串行
+SCAN_WORKERS = int(os.environ.get("YIKE_SCAN_WORKERS", "8"))
+# 重读校验（check_integrity.py --verify）：大小和 mtime 都没变的文件沿用上次结果，
+# 另按上次校验时间从旧到新抽 VERIFY_SAMPLE 比例重读，滚动发现静默损坏；并行 VERIFY_WORKERS 个
+VERIFY_SAMPLE = float(os.environ.get("YIKE_VERIFY_SAMPLE", "0.02"))
+VERIFY_WORKERS = int(os.environ.get("YIKE_VERIFY_WORKERS", "4"))
+# 图片解码校验（check_integrity.py --decode）：进程数默认等于 CPU 核数；
+# YIKE_DECODE_FULL=0 只做 Pillow verify() 结构检查，不完整解码
+DECODE_WORKERS = int(os.environ.get(
+    "YIKE_DECODE_WORKERS", str(os.cpu_count() or 1)
+))
+DECODE_FULL = os.environ.get("YIKE_DECODE_FULL", "1") == "1"
 
 YIKE_HOME = "https://photo.baidu.com/photo/web/home"
 API_BASE = "https://photo.baidu.com"
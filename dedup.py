@@ -0,0 +1,173 @@
+# File: tools/yike-album/dedup.py
+"""内容级去重（YIKE_DEDUP=1 启用）
+
+同一张图以不同 fsid 出现（多次上传、不同设备备份）时只下载、只保存一份：
+- 列表带 md5 时，按 (md5, 大小) 找已下载的相同内容，直接硬链接过来，
+  不取下载链接、不传输；
+- 列表没有 md5 时，用下载中顺带算出的校验和（checksum.py），写完后若与
+  已有文件内容相同（逐字节比对确认），把新文件换成指向旧文件的硬链接。
+硬链接失败（FAT32/exFAT、跨盘等）时：免传输的条目改为本地复制，
+事后去重的条目保留原文件。每轮打印节省的传输次数与字节数，并累计到状态库，
+python dedup.py 查看累计报告。
+"""
+import filecmp
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import fileindex
+import state
+from config import DEDUP_ENABLED
+
+def _link(src: Path, dest: Path):
+    """让 dest 成为 src 的硬链接（先链到临时名再原子替换）"""
+    tmp = dest.with_name(dest.name + ".link")
+    tmp.unlink(missing_ok=True)
+    os.link(src, tmp)
+    os.replace(tmp, dest)
+
+
+class ContentIndex:
+    """内容键 → 已下载文件名；内容键为 ("md5", md5, 大小) 或 (校验和, 大小)"""
+
+    def __init__(self, store, enabled: bool = DEDUP_ENABLED):
+        self.store = store
+        self.enabled = enabled
+        self._keys = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"skipped": 0, "skipped_bytes": 0, "copied": 0,
+                      "linked": 0, "linked_bytes": 0, "link_failed": 0}
+
+    def load(self):
+        """提前从状态库建立内容键表（下载开始前调用）"""
+        if self.enabled:
+            with self._lock:
+                self._data()
+
+    def _data(self) -> dict:
+        if self._keys is None:
+            keys = {}
+            for r in self.store.items(state.DONE):
+                if not r["name"] or not r["size"]:
+                    continue
+                if r["md5"]:
+                    keys[("md5", r["md5"], r["size"])] = r["name"]
+                if r["checksum"]:
+                    keys[(r["checksum"], r["size"])] = r["name"]
+            self._keys = keys
+        return self._keys
+
+    @staticmethod
+    def _listing_key(item):
+        if item.md5 and item.size:
+            return ("md5", item.md5, item.size)
+        return None
+
+    def _existing(self, key, item, index) -> str:
+        """内容键对应的、仍在磁盘上且大小一致的另一个文件名"""
+        name = self._data().get(key)
+        if name and name != item.filename and index.size(name) == item.size:
+            return name
+        return None
+
+    def link_existing(self, item, download_dir: Path) -> bool:
+        """列表 md5 命中已下载的文件时，直接链接/复制过来，返回 True 表示无需传输"""
+        key = self._listing_key(item)
+        if not self.enabled or key is None:
+            return False
+        index = fileindex.for_dir(download_dir)
+        with self._lock:
+            src_name = self._existing(key, item, index)
+        if not src_name:
+            return False
+        src, dest = download_dir / src_name, download_dir / item.filename
+        try:
+            _link(src, dest)
+            copied = False
+        except OSError:
+            shutil.copyfile(src, dest)
+            copied = True
+        index.add(item.filename, item.size)
+        with self._lock:
+            self.stats["skipped"] += 1
+            self.stats["skipped_bytes"] += item.size
+            if copied:
+                self.stats["copied"] += 1
+            else:
+                self.stats["linked_bytes"] += item.size
+        print(f"  [去重] {item.filename}: 与 {src_name} 内容相同，"
+              f"{'已复制' if copied else '已硬链接'}，跳过下载")
+        return True
+
+    def after_download(self, item, download_dir: Path, digest: str = None):
+        """下载完成后登记内容；与已有文件逐字节相同时换成硬链接"""
+        if not self.enabled:
+            return
+        key = self._listing_key(item) or (digest and (digest, item.size))
+        if not key:
+            return
+        index = fileindex.for_dir(download_dir)
+        with self._lock:
+            src_name = self._existing(key, item, index)
+            if not src_name:
+                self._data()[key] = item.filename
+                return
+        src, dest = download_dir / src_name, download_dir / item.filename
+        if not filecmp.cmp(src, dest, shallow=False):
+            return
+        try:
+            _link(src, dest)
+        except OSError as e:
+            with self._lock:
+                self.stats["link_failed"] += 1
+            print(f"  [去重] {item.filename}: 硬链接失败，保留原文件 ({e})")
+            return
+        with self._lock:
+            self.stats["linked"] += 1
+            self.stats["linked_bytes"] += item.size
+        print(f"  [去重] {item.filename}: 与 {src_name} 内容相同，已换成硬链接")
+
+    def format_stats(self, stats: dict = None) -> str:
+        s = dict.fromkeys(self.stats, 0)
+        s.update(stats or self.stats)
+        text = (f"免下载 {s['skipped']} 个, 节省传输 "
+                f"{s['skipped_bytes'] / 1024 / 1024:.1f}MB")
+        if s["copied"]:
+            text += f"（其中 {s['copied']} 个无法硬链接，改为本地复制）"
+        text += (f"; 下载后换成硬链接 {s['linked']} 个; 硬链接共节省磁盘 "
+                 f"{s['linked_bytes'] / 1024 / 1024:.1f}MB")
+        if s["link_failed"]:
+            text += f"; 硬链接失败 {s['link_failed']} 个"
+        return text
+
+    def save_report(self):
+        """把本轮节省量累加到状态库（kv: dedup_stats）"""
+        if not self.enabled or not any(self.stats.values()):
+            return
+        total = self.store.get_value("dedup_stats") or {}
+        for k, v in self.stats.items():
+            total[k] = total.get(k, 0) + v
+        self.store.set_value("dedup_stats", total)
+
+
+content = ContentIndex(state.store)
+
+
+def main():
+    total = state.store.get_value("dedup_stats")
+    state.store.close()
+    print("=" * 50)
+    print("  内容去重累计报告")
+    print("=" * 50)
+    if not total:
+        print("[去重] 暂无记录（需以 YIKE_DEDUP=1 运行 download.py）")
+        return
+    print(f"[去重] {content.format_stats(total)}")
+
+
+if __name__ == "__main__":
+    main()
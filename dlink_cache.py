@@ -0,0 +1,135 @@
+# File: tools/yike-album/dlink_cache.py
+"""dlink 缓存：按 fsid 保存直链及获取时间，过期或 CDN 返回 403/404 即失效
+
+持久化在状态库 items 表的 dlink/dlink_at 列，只写入变化的条目。
+get_download_link / get_download_link_async 是获取直链的唯一入口：
+先查缓存，未命中才取 API 令牌请求下载链接 API，各引擎和脚本共用同一套错误约定。
+"""
+import threading
+import time
+
+import httpx
+
+import concurrency
+import ratelimit
+import state
+from config import API_BASE, DLINK_TTL, DOWNLOAD_API
+
+# 累计这么多次写入后落盘一次
+SAVE_EVERY = 50
+
+
+class DlinkCache:
+    """线程安全的 fsid → (dlink, fetched_at) 缓存"""
+
+    def __init__(self, store: state.StateStore, ttl: float):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._dirty = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if self._data is not None:
+            return
+        self._data = self.store.dlinks(self.ttl)
+
+    def get(self, fsid: str):
+        """返回未过期的 dlink，没有则返回 None"""
+        fsid = str(fsid)
+        with self._lock:
+            self._load()
+            entry = self._data.get(fsid)
+            if entry and time.time() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._data[fsid]
+                self._dirty[fsid] = None
+            self.misses += 1
+            return None
+
+    def put(self, fsid: str, dlink: str):
+        with self._lock:
+            self._load()
+            entry = [dlink, time.time()]
+            self._data[str(fsid)] = entry
+            self._dirty[str(fsid)] = entry
+            flush = len(self._dirty) >= SAVE_EVERY
+        if flush:
+            self.save()
+
+    def invalidate(self, fsid: str):
+        with self._lock:
+            self._load()
+            if self._data.pop(str(fsid), None) is not None:
+                self._dirty[str(fsid)] = None
+
+    def save(self):
+        """把变化的条目写入状态库"""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+        self.store.save_dlinks(dirty)
+
+    def format_stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"命中={self.hits} 未命中={self.misses} ({rate:.0%})"
+
+
+cache = DlinkCache(state.store, DLINK_TTL)
+
+
+def _params(fsid: str) -> dict:
+    return {"clienttype": "70", "fsid": fsid}
+
+
+def _accept(fsid: str, data: dict) -> str:
+    """解析下载链接 API 的响应并写入缓存；失败抛 RuntimeError"""
+    errno = data.get("errno")
+    if errno != 0:
+        if errno == 50007:
+            raise RuntimeError("需要VIP会员 (errno=50007)")
+        concurrency.signal_error("api")
+        raise RuntimeError(f"下载链接获取失败: errno={errno}")
+    dlink = data.get("dlink", "")
+    if not dlink:
+        raise RuntimeError(f"dlink 为空, fsid={fsid}")
+    cache.put(fsid, dlink)
+    return dlink
+
+
+def get_download_link(client: httpx.Client, fsid: str) -> str:
+    """获取下载直链（有效期约8小时，优先用缓存）
+
+    只有真正请求 API 时才取全局令牌，缓存命中不限速。
+    errno 非 0 或 dlink 为空抛 RuntimeError（VIP 限制以外的 errno 同时记为拥塞信号）。
+    """
+    dlink = cache.get(fsid)
+    if dlink:
+        return dlink
+    ratelimit.acquire_api()
+    resp = client.get(API_BASE + DOWNLOAD_API, params=_params(fsid), timeout=30)
+    return _accept(fsid, resp.json())
+
+
+async def get_download_link_async(client: httpx.AsyncClient, fsid: str) -> str:
+    """异步版 get_download_link，缓存与错误约定相同"""
+    dlink = cache.get(fsid)
+    if dlink:
+        return dlink
+    await ratelimit.acquire_api_async()
+    resp = await client.get(API_BASE + DOWNLOAD_API, params=_params(fsid),
+                            timeout=30)
+    return _accept(fsid, resp.json())
+
+
+def invalidate_on_error(fsid: str, exc: Exception):
+    """CDN 返回 403/404 说明直链已失效，立即从缓存剔除"""
+    if isinstance(exc, httpx.HTTPStatusError) and \
+            exc.response.status_code in (403, 404):
+        cache.invalidate(fsid)
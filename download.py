@@ -1,21 +1,45 @@
 # File: tools/yike-album/download.py
-"""一刻相册批量下载 - 基于实际验证的 API"""
+"""一刻相册批量下载 - 基于实际验证的 API
+
+照片和视频在同一轮里下载：每个条目按媒体类型选用 media.py 中的传输参数。
+python download.py --queue [报告路径]：不拉列表，只重下 check_integrity.py
+核对报告中 queue 列出的条目。
+"""
 import json
+import random
 import time
 import sys
 import threading
 from pathlib import Path
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 
 from config import (
-    DOWNLOAD_DIR, PROBE_RESULT_FILE, PROGRESS_FILE,
-    API_BASE, LIST_API, DOWNLOAD_API,
-    LIST_PAGE_SIZE, DOWNLOAD_TIMEOUT, REQUEST_DELAY,
-    CONCURRENT_DOWNLOADS,
+    DOWNLOAD_DIR, PROBE_RESULT_FILE,
+    API_BASE, LIST_API,
+    LIST_PAGE_SIZE,
+    CONCURRENT_DOWNLOADS, DOWNLOAD_ENGINE, ASYNC_CONCURRENCY,
+    RESOLVE_WORKERS, RESOLVE_QUEUE_SIZE, SCHEDULE_POLICY,
+    SYNC_MODE, FULL_RESCAN_DAYS, LIST_RETRIES, LIST_RETRY_DELAY,
+    AUDIT_REPORT_FILE,
 )
+import bandwidth
+import check_integrity
+import checksum
+import concurrency
+import dedup
+import dlink_cache
+import fileindex
+import media
+import ratelimit
+import resume
+import scheduler
+import segments
+import state
+from dlink_cache import get_download_link
+from records import MediaItem
+from transport import make_client, get_client, close_clients, format_stats
 
 
 def load_cookies() -> dict:
@@ -33,274 +57,609 @@ def load_cookies() -> dict:
     return cookies
 
 
-def load_progress() -> set:
-    if not PROGRESS_FILE.exists():
-        return set()
-    data = json.loads(PROGRESS_FILE.read_text(encoding="utf-8"))
-    return set(data.get("downloaded", []))
+# 重试也没用的 errno（登录失效）
+_FATAL_ERRNO = {-6}
 
 
-def save_progress(downloaded: set):
-    PROGRESS_FILE.write_text(
-        json.dumps({"downloaded": sorted(downloaded)}, ensure_ascii=False),
-        encoding="utf-8",
-    )
+class ListingError(Exception):
+    """列表翻页重试用尽，或遇到不可重试的错误"""
+
+
+def _list_page(client: httpx.Client, cursor: str, page_num: int) -> dict:
+    """请求一页列表；errno/HTTP/网络临时错误按指数退避重试"""
+    params = {
+        "clienttype": "70",
+        "need_thumbnail": "0",
+        "need_filter_hidden": "0",
+        "num": str(LIST_PAGE_SIZE),
+    }
+    if cursor:
+        params["cursor"] = cursor
+    for attempt in range(LIST_RETRIES + 1):
+        try:
+            ratelimit.acquire_api()
+            resp = client.get(API_BASE + LIST_API, params=params, timeout=30)
+            if resp.status_code in (401, 403):
+                raise ListingError(f"HTTP {resp.status_code}，Cookie 可能已过期")
+            resp.raise_for_status()
+            data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            reason = f"{type(e).__name__}: {e}"
+        else:
+            errno = data.get("errno")
+            if errno == 0:
+                return data
+            if errno in _FATAL_ERRNO:
+                raise ListingError(f"errno={errno}，Cookie 可能已过期")
+            reason = f"errno={errno}"
+        if attempt == LIST_RETRIES:
+            raise ListingError(f"{reason}（已重试 {LIST_RETRIES} 次）")
+        delay = LIST_RETRY_DELAY * 2 ** attempt * random.uniform(0.8, 1.2)
+        print(f"[下载] 第{page_num}页获取失败: {reason}，"
+              f"{delay:.1f}s 后重试 ({attempt + 1}/{LIST_RETRIES})")
+        time.sleep(delay)
+
 
+def iter_photo_pages(client: httpx.Client, known: set = None,
+                     start: dict = None, outcome: dict = None):
+    """分页拉取照片元数据，每拉到一页就 yield (该页条目, 下一页位置)
 
-def fetch_all_photos(client: httpx.Client) -> list:
-    """分页拉取全部照片元数据"""
-    all_photos = []
-    cursor = None
-    page_num = 0
+    下一页位置为 {"cursor", "page", "count"}，已是最后一页时为 None；
+    把它传给 start 即可从该位置继续翻页。
+    传入 known（已知 fsid 集合）时为增量模式：某一页全部是已知条目就停止翻页。
+    翻页重试用尽时停止并把原因写入 outcome["error"]（不抛异常），已产出的页仍有效。
+    """
+    pos = dict(start or {"cursor": None, "page": 0, "count": 0})
     while True:
-        params = {
-            "clienttype": "70",
-            "need_thumbnail": "0",
-            "need_filter_hidden": "0",
-            "num": str(LIST_PAGE_SIZE),
-        }
-        if cursor:
-            params["cursor"] = cursor
-        resp = client.get(API_BASE + LIST_API, params=params, timeout=30)
-        data = resp.json()
-        if data.get("errno") != 0:
-            print(f"[下载] 列表API错误: errno={data.get('errno')}")
-            break
+        try:
+            data = _list_page(client, pos["cursor"], pos["page"] + 1)
+        except ListingError as e:
+            print(f"[下载] 列表API错误: {e}，列表不完整")
+            if outcome is not None:
+                outcome["error"] = str(e)
+            return
         items = data.get("list", [])
-        all_photos.extend(items)
-        page_num += 1
-        print(f"[下载] 第{page_num}页: 获取{len(items)}张, 累计{len(all_photos)}张")
-        if not data.get("has_more"):
+        pos = {"cursor": data.get("cursor"), "page": pos["page"] + 1,
+               "count": pos["count"] + len(items)}
+        print(f"[下载] 第{pos['page']}页: 获取{len(items)}张, 累计{pos['count']}张")
+        last = not data.get("has_more") or not pos["cursor"]
+        yield items, None if last else pos
+        if known is not None and items and \
+                all(str(i["fsid"]) in known for i in items):
+            print(f"[同步] 第{pos['page']}页全部为已知条目，停止翻页")
             break
-        cursor = data.get("cursor")
-        if not cursor:
+        if last:
             break
-        time.sleep(REQUEST_DELAY)
-    return all_photos
 
 
-def get_download_link(client: httpx.Client, fsid: str) -> str:
-    """获取单张照片的下载直链（有效期约8小时）"""
-    params = {"clienttype": "70", "fsid": fsid}
-    resp = client.get(
-        API_BASE + DOWNLOAD_API, params=params, timeout=30
-    )
-    data = resp.json()
-    if data.get("errno") != 0:
-        raise RuntimeError(f"下载链接获取失败: errno={data.get('errno')}")
-    dlink = data.get("dlink", "")
-    if not dlink:
-        raise RuntimeError(f"dlink 为空, fsid={fsid}")
-    return dlink
-
-
-def make_filename(photo: dict) -> str:
-    """根据拍摄时间生成文件名，避免重名"""
-    ext = Path(photo.get("path", ".jpg")).suffix or ".jpg"
-    exif_dt = (photo.get("extra_info") or {}).get("date_time", "")
-    if exif_dt:
-        try:
-            dt = datetime.strptime(exif_dt, "%Y:%m:%d %H:%M:%S")
-            return dt.strftime("%Y%m%d_%H%M%S") + f"_{photo['fsid']}{ext}"
-        except ValueError:
-            pass
-    ts = photo.get("shoot_time", 0)
-    if ts:
-        dt = datetime.fromtimestamp(ts)
-        return dt.strftime("%Y%m%d_%H%M%S") + f"_{photo['fsid']}{ext}"
-    return f"unknown_{photo['fsid']}{ext}"
-
-
-def download_single_photo(
-    client: httpx.Client, photo: dict, download_dir: Path
+def fetch_all_photos(client: httpx.Client, known: set = None) -> list:
+    """一次取完整个列表（不边翻页边下载时用）"""
+    return [p for page, _ in iter_photo_pages(client, known) for p in page]
+
+
+def make_filename(photo) -> str:
+    """根据拍摄时间生成文件名，避免重名（MediaItem 或列表 API 原始条目）"""
+    if isinstance(photo, MediaItem):
+        return photo.filename
+    return MediaItem.from_api(photo).filename
+
+
+def is_complete(item: MediaItem, download_dir: Path) -> bool:
+    """本地文件已存在、大小与 API 一致，且库中校验和不与 md5 冲突（不访问磁盘）"""
+    return bool(item.size) and \
+        fileindex.for_dir(download_dir).size(item.filename) == item.size and \
+        not checksum.verify(item.md5, item.checksum)
+
+
+def _stream_to_file(client: httpx.Client, dlink: str, dest: Path,
+                    profile: media.Profile, digest=None) -> int:
+    """整文件直接写入 dest（照片），返回写入大小；传入 digest 时边写边算校验和"""
+    written = 0
+    with client.stream(
+        "GET", dlink, timeout=profile.timeout, headers=profile.headers,
+    ) as resp:
+        resp.raise_for_status()
+        with bandwidth.stream() as bw, open(dest, "wb") as f:
+            for chunk in resp.iter_bytes(profile.chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                bw.consume(len(chunk))
+    return written
+
+
+def download_item(
+    client: httpx.Client, item: MediaItem, download_dir: Path,
+    dlink: str = None,
 ) -> bool:
-    """下载单张照片，成功返回 True。用文件大小校验完整性"""
-    fsid = str(photo["fsid"])
-    filename = make_filename(photo)
-    expected_size = photo.get("size", 0)
+    """下载单个条目（照片或视频），成功返回 True。用文件大小与校验和校验完整性
+
+    按媒体类型选传输参数：照片整文件直写；视频写 .part，失败保留断点，
+    下次 Range 续传，大文件分段并行。校验和在接收循环里顺带计算，
+    列表带 md5 时写完即比对，结果存入 item.checksum。
+    dlink 由流水线的解析阶段提前获取时传入，此时不再调用下载链接 API。
+    """
+    profile = media.profile_for(item)
+    fsid = item.fsid
+    filename = item.filename
+    expected_size = item.size
     dest = download_dir / filename
-    # 已存在且大小匹配 → 跳过
-    if dest.exists() and expected_size and dest.stat().st_size == expected_size:
-        return True
-    # 已存在但大小不对 → 删掉重下
-    if dest.exists() and expected_size and dest.stat().st_size != expected_size:
-        print(f"  [重下] {filename}: 大小不匹配 {dest.stat().st_size} vs {expected_size}")
+    index = fileindex.for_dir(download_dir)
+    have = index.size(filename)
+    if have is not None:
+        # 已存在且大小匹配、库中校验和与 md5 不冲突 → 跳过
+        stale = checksum.verify(item.md5, item.checksum)
+        if expected_size and have == expected_size and not stale:
+            return True
+        # 其余情况一律先删掉再重下：dest 可能是去重硬链接，原地 "wb" 会改写源文件
+        reason = stale or (f"大小不匹配 {have} vs {expected_size}"
+                           if expected_size else "大小未知")
+        print(f"  [重下] {filename}: {reason}")
         dest.unlink(missing_ok=True)
+        index.remove(filename)
+    # 内容去重：列表 md5 命中已下载的文件则直接链接，不再传输
+    if dedup.content.link_existing(item, download_dir):
+        return True
+    if dlink is None:
+        try:
+            dlink = get_download_link(client, fsid)
+        except RuntimeError as e:
+            print(f"  [跳过] {filename}: {e}")
+            return False
+    digest = checksum.for_item(item)
+    start = time.monotonic()
     try:
-        dlink = get_download_link(client, fsid)
-        time.sleep(REQUEST_DELAY)
+        if profile.resumable:
+            size = segments.download(
+                client, dlink, dest, expected_size, profile.chunk_size,
+                profile.timeout, profile.headers, digest=digest,
+            )
+        else:
+            size = _stream_to_file(client, dlink, dest, profile, digest)
     except RuntimeError as e:
-        print(f"  [跳过] {filename}: {e}")
+        # .part 写完后大小不符（resume.finish / segments 抛出）
+        print(f"  [校验失败] {filename}: {e}")
         return False
-    try:
-        with client.stream(
-            "GET", dlink, timeout=DOWNLOAD_TIMEOUT,
-            headers={"User-Agent": "pan.baidu.com"},
-        ) as resp:
-            resp.raise_for_status()
-            with open(dest, "wb") as f:
-                for chunk in resp.iter_bytes(8192):
-                    f.write(chunk)
     except Exception as e:
         print(f"  [失败] {filename}: {e}")
-        if dest.exists():
+        dlink_cache.invalidate_on_error(fsid, e)
+        concurrency.signal_exception(e)
+        if not profile.resumable:
             dest.unlink(missing_ok=True)
         return False
-    # 下载后校验大小
-    if expected_size and dest.stat().st_size != expected_size:
-        print(f"  [校验失败] {filename}: 下载{dest.stat().st_size} 期望{expected_size}")
+    media.stats.transfer(item, size, time.monotonic() - start)
+    # 下载后校验
+    problem = profile.check(size, expected_size)
+    if not problem:
+        # 分段下载的文件无法边下边算，此时写完后读一遍
+        item.checksum = checksum.finish(digest, dest)
+        problem = checksum.verify(item.md5, item.checksum)
+    if problem:
+        print(f"  [校验失败] {filename}: {problem}")
         dest.unlink(missing_ok=True)
         return False
+    # 记下真实 mtime：校验和连同大小+mtime 一起存库，之后重读校验可以跳过
+    index.add(filename, size, dest.stat().st_mtime)
+    dedup.content.after_download(item, download_dir, item.checksum)
     return True
 
 
-def dedup_photos(photos: list) -> list:
-    """按 fsid 去重，保留第一次出现的"""
-    seen = set()
-    unique = []
-    for p in photos:
-        fsid = str(p["fsid"])
-        if fsid in seen:
+def _save_meta(batch: list):
+    """写入一批元数据；已下载条目若云端大小/md5 变化则重置为待下载
+
+    大小不变、只有 md5 变化时本地文件仍能通过大小检查，所以删掉旧文件
+    （连同续传残留）、清空库中的校验和并丢弃缓存的旧直链，保证重新传输。
+    """
+    rows = state.store.get_rows([p["fsid"] for p in batch])
+    changed = []
+    for p in batch:
+        row = rows.get(str(p["fsid"]))
+        if not row or row["status"] != state.DONE:
             continue
-        seen.add(fsid)
-        unique.append(p)
-    dup_count = len(photos) - len(unique)
-    if dup_count:
-        print(f"[下载] 去重: 移除 {dup_count} 条重复记录")
-    return unique
-
-
-def make_client(cookies: dict) -> httpx.Client:
-    """创建一个 httpx Client（每线程一个，httpx 非线程安全）"""
-    return httpx.Client(
-        cookies=cookies,
-        headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"
-            ),
-            "Referer": "https://photo.baidu.com/",
-        },
-        follow_redirects=True, timeout=30,
-    )
+        if (p.get("size") and row["size"] and p["size"] != row["size"]) or \
+                (p.get("md5") and row["md5"] and p["md5"] != row["md5"]):
+            changed.append(row)
+    state.store.upsert_meta(
+        [{"fsid": p["fsid"], "name": make_filename(p), "path": p.get("path"),
+          "size": p.get("size"), "md5": p.get("md5")} for p in batch])
+    if changed:
+        for row in changed:
+            if row["name"]:
+                dest = DOWNLOAD_DIR / row["name"]
+                dest.unlink(missing_ok=True)
+                resume.discard(dest)
+                fileindex.index.remove(row["name"])
+            dlink_cache.cache.invalidate(row["fsid"])
+        state.store.reset_content([row["fsid"] for row in changed])
+        print(f"[同步] {len(changed)} 条云端已修改，删除旧文件并重新下载")
+
+
+def sync_pages(client: httpx.Client, summary: dict):
+    """获取照片列表：平时增量，定期全量；逐页 yield 去重后的条目（MediaItem）
+
+    每页到达就在线去重（只保留 fsid 集合）并写入状态库，调用方可以立刻开始下载；
+    原始条目写库后即丢弃，只把紧凑的 MediaItem 交给下载队列。
+    增量模式只拉到第一页全是已知条目为止；全量模式拉完整列表，
+    并把本轮扫描中没出现过的条目标记为 deleted。两种模式最后都从状态库
+    补齐其余未完成的条目。
+    每页写库后把下一页游标存为断点（kv: list_checkpoint），中断或翻页失败后
+    下次运行从断点继续；翻页失败的一轮记为列表不完整（kv: listing），
+    此时不标记删除，校验脚本也会提示总数不可信。
+    summary 在生成器结束后填好：total / new / dup / deleted / complete。
+    """
+    known = state.store.known_fsids()
+    last_full = state.store.get_value("last_full_scan", 0)
+    age_days = (time.time() - last_full) / 86400
+    checkpoint = state.store.get_value("list_checkpoint")
+    if checkpoint:
+        full = checkpoint["mode"] == "full"
+        started = checkpoint["started"]
+        print(f"[同步] 上次{'全量' if full else '增量'}扫描在第{checkpoint['page']}页后中断，"
+              f"从断点继续（已获取 {checkpoint['count']} 张）")
+    else:
+        full = SYNC_MODE == "full" or not known or age_days >= FULL_RESCAN_DAYS
+        started = time.time()
+        if full:
+            reason = ("YIKE_SYNC=full" if SYNC_MODE == "full" else
+                      "状态库为空" if not known else f"距上次全量 {age_days:.1f} 天")
+            print(f"[同步] 全量扫描（{reason}）")
+        else:
+            print(f"[同步] 增量扫描（已知 {len(known)} 条，上次全量 {age_days:.1f} 天前）")
+    mode = "full" if full else "incremental"
+    summary.update(total=0, new=0, dup=0, deleted=0, complete=True)
+    seen = set()
+    listed = checkpoint["count"] if checkpoint else 0
+    outcome = {}
+    for page, pos in iter_photo_pages(client, None if full else known,
+                                      checkpoint, outcome):
+        listed += len(page)
+        batch = []
+        for p in page:
+            fsid = str(p["fsid"])
+            if fsid in seen:
+                summary["dup"] += 1
+                continue
+            seen.add(fsid)
+            batch.append(p)
+            if fsid not in known:
+                summary["new"] += 1
+        if batch:
+            _save_meta(batch)
+        if pos:
+            # 本页已落库，断点指向下一页
+            state.store.set_value("list_checkpoint",
+                                  dict(pos, mode=mode, started=started))
+        if batch:
+            yield [MediaItem.from_api(p) for p in batch]
+    if summary["dup"]:
+        print(f"[下载] 去重: 移除 {summary['dup']} 条重复记录")
+    error = outcome.get("error")
+    summary["complete"] = not error
+    state.store.set_value("listing", {"complete": not error, "mode": mode,
+                                      "at": time.time(), "error": error})
+    if error:
+        if checkpoint and not seen:
+            # 从断点续拉第一页就失败，游标可能已失效，下次从头开始
+            state.store.set_value("list_checkpoint", None)
+            print("[同步] 断点游标可能已失效，已清除，下次从第一页重新扫描")
+        else:
+            print("[同步] 列表不完整，断点已保存，下次运行从断点继续"
+                  + ("；本轮不标记删除" if full else ""))
+    else:
+        state.store.set_value("list_checkpoint", None)
+        if full and listed:
+            gone = state.store.unlisted_since(started)
+            if gone:
+                state.store.set_status([(f, state.DELETED, None) for f in gone])
+                summary["deleted"] = len(gone)
+                print(f"[同步] {len(gone)} 条云端已删除，标记为 deleted")
+            state.store.set_value("last_full_scan", time.time())
+    summary["total"] = len(state.store.known_fsids())
+    if not full:
+        print(f"[同步] 新增 {summary['new']} 条")
+    # 按页从状态库取其余未完成的条目，不把整个剩余列表读进内存
+    for rows in state.store.item_pages(
+            (state.PENDING, state.FAILED, state.MISSING, state.MISMATCH),
+            LIST_PAGE_SIZE):
+        rest = [MediaItem.from_row(r) for r in rows
+                if r["fsid"] not in seen and (r["path"] or r["name"])]
+        if rest:
+            yield rest
 
 
 # 线程安全的进度管理
 _lock = threading.Lock()
-_counter = {"ok": 0, "fail": 0, "done": 0}
-_downloaded_set: set = set()
+_counter = {"ok": 0, "fail": 0, "done": 0, "todo": 0, "listed": False}
 _failed_list: list = []
 
 
-def _worker(photo: dict, cookies: dict, total: int):
-    """单个下载任务（线程池调用）"""
-    fsid = str(photo["fsid"])
-    name = make_filename(photo)
-    client = make_client(cookies)
-    try:
-        ok = download_single_photo(client, photo, DOWNLOAD_DIR)
-    finally:
-        client.close()
+def _todo_batches(client: httpx.Client, summary: dict):
+    """列表页 → 待下载批次：跳过状态库中已完成的条目"""
+    for batch in sync_pages(client, summary):
+        rows = state.store.get_rows([p.fsid for p in batch])
+        todo = []
+        for p in batch:
+            row = rows.get(p.fsid, {})
+            if row.get("status") == state.DONE:
+                continue
+            # 带上库中的校验和，跳过检查据此发现大小相同、内容已变的文件
+            p.checksum = row.get("checksum")
+            todo.append(p)
+        if todo:
+            yield todo
+
+
+def _counted(batches):
+    """边产出批次边累计待下载数，来源取完后标记列表结束"""
+    for batch in batches:
+        with _lock:
+            _counter["todo"] += len(batch)
+        yield batch
+    _counter["listed"] = True
+
+
+def _record(item: MediaItem, ok: bool):
+    """记录单个任务结果（线程引擎与异步引擎共用）"""
+    fsid = item.fsid
+    name = item.filename
+    # 下载时算出的校验和即一次校验，连同 mtime 记入校验缓存
+    entry = fileindex.index.get(name) if ok and item.checksum else None
+    # 只入队，由状态库后台线程批量写入，不在进度锁内做文件 I/O
+    state.store.mark(fsid, state.DONE if ok else state.FAILED,
+                     nbytes=item.size if ok else None,
+                     checksum=item.checksum if ok else None,
+                     mtime=entry[1] if entry else None)
+    media.stats.result(item, ok)
     with _lock:
         _counter["done"] += 1
         done = _counter["done"]
         if ok:
             _counter["ok"] += 1
-            _downloaded_set.add(fsid)
         else:
             _counter["fail"] += 1
             _failed_list.append({"fsid": fsid, "name": name})
-        if done % 20 == 0 or done == total:
-            save_progress(_downloaded_set)
-            print(f"[下载] 进度: {done}/{total} "
-                  f"(成功={_counter['ok']} 失败={_counter['fail']})")
+        total = _counter["todo"]
+        # 列表还没翻完时总数会继续增长，用 + 标出
+        more = "" if _counter["listed"] else "+"
+        if done % 20 == 0 or (not more and done == total):
+            print(f"[下载] 进度: {done}/{total}{more} "
+                  f"(成功={_counter['ok']} 失败={_counter['fail']}) "
+                  f"{bandwidth.format_status()}")
+
+
+def _transfer(client: httpx.Client, item: MediaItem, dlink: str = None) -> bool:
+    """下载一个条目：先在名额之外取链接（等 API 令牌时不占传输名额），再占名额传输"""
+    if dlink is None:
+        try:
+            dlink = _resolve(client, item)
+        except RuntimeError as e:
+            print(f"  [跳过] {item.filename}: {e}")
+            return False
+    limiter = concurrency.controller
+    if limiter is None or dlink is None:
+        # 本地已完整或去重命中（dlink 为 None）时不传输，不占名额也不计入延迟统计
+        return download_item(client, item, DOWNLOAD_DIR, dlink=dlink)
+    with limiter.slot() as slot:
+        ok = download_item(client, item, DOWNLOAD_DIR, dlink=dlink)
+        if ok:
+            slot["bytes"] = item.size
+    return ok
+
+
+def _worker(item: MediaItem, cookies: dict):
+    """单个下载任务（线程池调用）
+
+    取链接时的网络错误、超时、响应解析失败等非 RuntimeError 异常也记为失败，
+    与流水线、异步引擎一致，保证每个条目都有结果。
+    """
+    client = get_client(cookies)
+    try:
+        ok = _transfer(client, item)
+    except Exception as e:
+        print(f"  [异常] {item.filename}: {e}")
+        concurrency.signal_exception(e)
+        ok = False
+    _record(item, ok)
     return ok
 
 
+def _run_threads(batches, cookies: dict) -> float:
+    """线程池引擎，返回耗时(秒)"""
+    start = time.monotonic()
+    # 多开 RESOLVE_WORKERS 个线程等令牌取链接，实际传输数由闸门限制
+    workers = concurrency.max_transfers() + RESOLVE_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scheduler.run(pool, lambda p: _worker(p, cookies), batches,
+                      _item_size, workers, "[下载]")
+    close_clients()
+    return time.monotonic() - start
+
+
+def _item_size(item: MediaItem) -> int:
+    return item.size
+
+
+def _resolve(client: httpx.Client, item: MediaItem):
+    """流水线解析阶段：本地已完整（或内容去重命中）的不再请求下载链接"""
+    if is_complete(item, DOWNLOAD_DIR) or \
+            dedup.content.link_existing(item, DOWNLOAD_DIR):
+        return None
+    return get_download_link(client, item.fsid)
+
+
+def _run_pipeline(batches, cookies: dict) -> float:
+    """两级流水线引擎，返回耗时(秒)"""
+    from pipeline import Pipeline
+    return Pipeline(
+        cookies,
+        resolve_fn=_resolve,
+        transfer_fn=_transfer,
+        on_result=_record,
+        name_fn=make_filename,
+        size_fn=_item_size,
+        resolvers=RESOLVE_WORKERS,
+        transfers=concurrency.max_transfers(),
+        queue_size=RESOLVE_QUEUE_SIZE,
+        tag="[下载]",
+    ).run(scheduler.stream(batches, _item_size))
+
+
+def _run_async(batches, cookies: dict) -> float:
+    """异步引擎，返回耗时(秒)"""
+    import async_engine
+    return async_engine.run(
+        scheduler.stream(batches, _item_size), cookies,
+        lambda client, p: async_engine.download_item(client, p, DOWNLOAD_DIR),
+        _record,
+        ASYNC_CONCURRENCY,
+    )
+
+
+def run_batches(batches, cookies: dict) -> float:
+    """用配置的引擎下载若干批条目（照片、视频混在一起），返回耗时(秒)
+
+    结果写入状态库；进度、失败列表与按类型统计在 _counter / _failed_list /
+    media.stats 中，调用前会清零。
+    """
+    if DOWNLOAD_ENGINE == "async":
+        print(f"[下载] 异步引擎, 并发数: {ASYNC_CONCURRENCY}")
+    elif DOWNLOAD_ENGINE == "pipeline":
+        print(f"[下载] 流水线: 解析线程 {RESOLVE_WORKERS}, "
+              f"传输线程 {CONCURRENT_DOWNLOADS}, 队列 {RESOLVE_QUEUE_SIZE}")
+    else:
+        print(f"[下载] 并发线程数: {CONCURRENT_DOWNLOADS}")
+    _counter.update(ok=0, fail=0, done=0, todo=0, listed=False)
+    _failed_list.clear()
+    media.stats.reset()
+    # 一次 scandir 建立下载目录索引，之后的跳过检查只查内存
+    fileindex.index.load()
+    dedup.content.load()
+    dedup.content.reset_stats()
+    batches = _counted(batches)
+    if DOWNLOAD_ENGINE != "async":
+        concurrency.start("[下载]")
+    try:
+        if DOWNLOAD_ENGINE == "async":
+            elapsed = _run_async(batches, cookies)
+        elif DOWNLOAD_ENGINE == "pipeline":
+            elapsed = _run_pipeline(batches, cookies)
+        else:
+            elapsed = _run_threads(batches, cookies)
+    finally:
+        concurrency.stop()
+    dlink_cache.cache.save()
+    return elapsed
+
+
+def load_queue(report_path: Path = AUDIT_REPORT_FILE) -> list:
+    """核对报告中的待重下条目 → MediaItem；内容不符的旧文件先删掉
+
+    大小正确但内容不符的文件会被跳过检查当成已完成，必须先删除；
+    偏小/偏大的文件由 download_item 按大小不符自动删除重下。
+    """
+    report = check_integrity.load_report(report_path)
+    if report is None:
+        print(f"[下载] 没有可用的核对报告: {report_path}，"
+              f"请先运行 python check_integrity.py")
+        return []
+    print(f"[下载] 核对报告: {report_path} (生成于 {report['generated_at']})")
+    index = fileindex.for_dir(DOWNLOAD_DIR)
+    for entry in report["corrupt"]:
+        (DOWNLOAD_DIR / entry["name"]).unlink(missing_ok=True)
+        index.remove(entry["name"])
+    rows = state.store.get_rows(report["queue"])
+    return [MediaItem.from_row(rows[fsid]) for fsid in report["queue"]
+            if fsid in rows and rows[fsid]["status"] != state.DELETED]
+
+
+def main_queue(report_path: Path = AUDIT_REPORT_FILE):
+    """按核对报告补下载，不拉列表"""
+    print("=" * 50)
+    print("  一刻相册补下载 (核对报告)")
+    print("=" * 50)
+    cookies = load_cookies()
+    DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        items = load_queue(report_path)
+        if not items:
+            print("[下载] 报告中没有需要重下的条目")
+            return
+        print(f"[下载] 待重下: {len(items)} 个, 调度策略: {SCHEDULE_POLICY}")
+        elapsed = run_batches([items], cookies)
+        print(f"\n[下载] 完成! 成功={_counter['ok']} 失败={_counter['fail']} "
+              f"总计={len(items)}")
+        for line in media.stats.format_lines():
+            print(f"[下载] {line}")
+        print(f"[下载] 引擎={DOWNLOAD_ENGINE} 用时 {elapsed:.1f}s")
+        print("[下载] 重新运行 python check_integrity.py 可更新核对报告")
+        if _failed_list:
+            print(f"\n  失败列表已记录到状态库: {state.store.path}")
+    finally:
+        state.store.close()
+
+
 def main():
+    if sys.argv[1:2] == ["--queue"]:
+        main_queue(Path(sys.argv[2]) if len(sys.argv) > 2
+                   else AUDIT_REPORT_FILE)
+        return
     print("=" * 50)
     print("  一刻相册批量下载 (并发模式)")
     print("=" * 50)
     cookies = load_cookies()
     DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Referer": "https://photo.baidu.com/",
-    }
-    client = httpx.Client(
-        cookies=cookies, headers=headers,
-        follow_redirects=True, timeout=30,
-    )
+    client = make_client(cookies)
     try:
-        print("[下载] 正在获取照片列表...")
-        photos = fetch_all_photos(client)
-        if not photos:
+        print(f"[下载] 边获取列表边下载（照片+视频）, 调度策略: {SCHEDULE_POLICY}")
+        # 列表逐页产出，元数据在同步时写入状态库供后续校验
+        summary = {}
+        elapsed = run_batches(_todo_batches(client, summary), cookies)
+        total_api = summary.get("total", 0)
+        if not total_api:
             print("[下载] 未获取到照片，请检查 Cookie 是否过期")
             return
-        print(f"[下载] 共 {len(photos)} 张照片")
-        # 去重
-        photos = dedup_photos(photos)
-        total_api = len(photos)
-        # 保存元数据供后续校验
-        meta_file = DOWNLOAD_DIR / "_photo_meta.json"
-        meta_file.write_text(json.dumps(
-            [{"fsid": p["fsid"], "path": p.get("path"), "size": p.get("size")}
-             for p in photos], ensure_ascii=False), encoding="utf-8")
-        downloaded = load_progress()
-        remaining = total_api - len(downloaded)
-        print(f"[下载] 已完成 {len(downloaded)} 张，剩余 {remaining} 张")
-        print(f"[下载] 并发线程数: {CONCURRENT_DOWNLOADS}")
-        _downloaded_set.update(downloaded)
-        _counter["ok"] = 0
-        _counter["fail"] = 0
-        _counter["done"] = 0
-        _failed_list.clear()
-        todo = [p for p in photos if str(p["fsid"]) not in downloaded]
-        total_todo = len(todo)
-        print(f"[下载] 待下载: {total_todo} 张")
-        with ThreadPoolExecutor(max_workers=CONCURRENT_DOWNLOADS) as pool:
-            futures = [pool.submit(_worker, p, cookies, total_todo)
-                       for p in todo]
-            for f in as_completed(futures):
-                try:
-                    f.result()
-                except Exception as e:
-                    print(f"  [异常] {e}")
-        save_progress(_downloaded_set)
+        downloaded = state.store.counts().get(state.DONE, 0)
         ok = _counter["ok"]
         fail = _counter["fail"]
         print(f"\n[下载] 完成! 成功={ok} 失败={fail} 总计={total_api}")
+        for line in media.stats.format_lines():
+            print(f"[下载] {line}")
+        if dedup.content.enabled:
+            print(f"[下载] 内容去重: {dedup.content.format_stats()}")
+            dedup.content.save_report()
+        if elapsed > 0:
+            print(f"[下载] 引擎={DOWNLOAD_ENGINE} 用时 {elapsed:.1f}s, "
+                  f"{_counter['done'] / elapsed:.1f} 个/秒")
+        print(f"[下载] 连接复用: {format_stats()}")
+        print(f"[下载] dlink 缓存: {dlink_cache.cache.format_stats()}")
+        print(f"[下载] {ratelimit.api_bucket.format_stats()}")
         print(f"[下载] 保存目录: {DOWNLOAD_DIR}")
         # 数量校验
         print(f"\n{'=' * 40}")
-        print(f"  数量校验")
+        print("  数量校验")
         print(f"{'=' * 40}")
         print(f"  API 总数(去重后): {total_api}")
-        print(f"  已下载(进度记录): {len(_downloaded_set)}")
-        local_files = [f for f in DOWNLOAD_DIR.iterdir()
-                       if f.is_file() and not f.name.startswith("_")]
-        print(f"  本地文件数:        {len(local_files)}")
-        missing = total_api - len(_downloaded_set)
+        if not summary["complete"]:
+            print("  ⚠ 本轮列表未拉完，API 总数不是完整图库，请重新运行续拉")
+        print(f"  已下载(进度记录): {downloaded}")
+        # 目录索引在下载过程中已随完成的文件更新，不再重新遍历目录
+        print(f"  本地文件数:        {len(fileindex.index.files())}")
+        missing = total_api - downloaded
         if missing > 0:
             print(f"  ⚠ 遗漏: {missing} 张未下载")
         else:
-            print(f"  ✓ 全部下载完成，无遗漏")
-        # 失败列表
+            print("  ✓ 全部下载完成，无遗漏")
+        # 失败列表（状态库中 status=failed，下次运行或视频脚本据此重下）
         if _failed_list:
-            fail_file = DOWNLOAD_DIR / "_failed.json"
-            fail_file.write_text(json.dumps(
-                _failed_list, ensure_ascii=False, indent=2),
-                encoding="utf-8")
-            print(f"\n  失败列表已保存: {fail_file}")
+            print(f"\n  失败列表已记录到状态库: {state.store.path}")
             for item in _failed_list[:10]:
                 print(f"    - {item['name']}")
             if len(_failed_list) > 10:
                 print(f"    ... 共 {len(_failed_list)} 条")
     finally:
         client.close()
+        state.store.close()
 
 
 if __name__ == "__main__":
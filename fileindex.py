@@ -0,0 +1,124 @@
+# File: tools/yike-album/fileindex.py
+"""下载目录的文件索引：一次 os.scandir 得到 文件名 → (大小, mtime)
+
+跳过检查、下载结束时的数量校验以及 stats/check_integrity/verify_download
+都查这一份快照，不再各自 glob + stat；下载完成或删除文件时只更新内存。
+目录在网络共享上时，每个文件的 exists/stat 都是一次往返，10 万个文件
+可能要好几秒，而 scandir 一次遍历就能拿到全部大小和修改时间。
+Windows 上 scandir 自带大小与时间；其他系统每个条目还要 stat 一次，
+用 SCAN_WORKERS 个线程并行做，网络盘上不再逐个排队等往返。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import DOWNLOAD_DIR, SCAN_WORKERS
+
+# 下载中的临时文件：resume.part_paths 的 .part / .part.json（分段下载同样），
+# dedup 硬链接替换用的 .link；不算下载好的媒体文件
+PARTIAL_SUFFIXES = (".part", ".part.json", ".link")
+
+
+class FileIndex:
+    """单个目录（不递归）的普通文件快照，第一次查询时建立，线程安全"""
+
+    def __init__(self, root: Path, workers: int = SCAN_WORKERS):
+        self.root = root
+        self.workers = workers
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> dict:
+        try:
+            with os.scandir(self.root) as it:
+                found = [entry for entry in it if entry.is_file()]
+        except FileNotFoundError:
+            return {}
+        if self.workers > 1 and os.name != "nt" and len(found) > 1:
+            with ThreadPoolExecutor(self.workers,
+                                    thread_name_prefix="scan") as pool:
+                stats = list(pool.map(_stat, found, chunksize=64))
+        else:
+            stats = [_stat(entry) for entry in found]
+        return {entry.name: st for entry, st in zip(found, stats) if st}
+
+    def _data(self) -> dict:
+        if self._entries is None:
+            self._entries = self._scan()
+        return self._entries
+
+    def load(self):
+        """提前建立快照（下载开始前调用，避免第一次查询时卡住事件循环/工作线程）"""
+        with self._lock:
+            self._data()
+
+    def refresh(self):
+        """丢弃快照，下次查询时重新扫描（其他进程改动过目录时用）"""
+        with self._lock:
+            self._entries = None
+
+    def get(self, name: str):
+        """(大小, mtime)，文件不存在返回 None"""
+        with self._lock:
+            return self._data().get(name)
+
+    def size(self, name: str):
+        entry = self.get(name)
+        return entry[0] if entry else None
+
+    def add(self, name: str, size: int, mtime: float = None):
+        """记录刚写完的文件；mtime 缺省用当前时间（近似值，下次扫描时更正）
+
+        同名的 .part / .part.json 续传文件此时已改名或删除，一并移出索引。
+        """
+        with self._lock:
+            data = self._data()
+            data[name] = (size, time.time() if mtime is None else mtime)
+            data.pop(name + ".part", None)
+            data.pop(name + ".part.json", None)
+
+    def remove(self, name: str):
+        with self._lock:
+            self._data().pop(name, None)
+
+    def files(self) -> dict:
+        """下载的媒体文件 {文件名: (大小, mtime)}
+
+        不含 _ 开头的状态/配置文件，也不含续传/去重留下的临时文件（PARTIAL_SUFFIXES）。
+        """
+        with self._lock:
+            return {n: e for n, e in self._data().items()
+                    if not n.startswith("_") and not n.endswith(PARTIAL_SUFFIXES)}
+
+    def partial_files(self) -> dict:
+        """未完成的续传/临时文件 {文件名: (大小, mtime)}"""
+        with self._lock:
+            return {n: e for n, e in self._data().items()
+                    if not n.startswith("_") and n.endswith(PARTIAL_SUFFIXES)}
+
+
+def _stat(entry):
+    """(大小, mtime)；扫描过程中被删掉的文件返回 None"""
+    try:
+        st = entry.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def for_dir(root: Path) -> FileIndex:
+    """同一目录在进程内共用一个索引"""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = FileIndex(Path(root))
+        return _indexes[key]
+
+
+index = for_dir(DOWNLOAD_DIR)
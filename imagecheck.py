@@ -0,0 +1,156 @@
+# File: tools/yike-album/imagecheck.py
+"""图片解码校验（check_integrity.py --decode）
+
+大小正确的照片仍可能是坏的：恰好同样长度的 HTML 错误页、中途截断或
+内容损坏的 JPEG（列表没有 md5 时校验和也发现不了）。这里用 Pillow 对每张照片先 verify() 检查结构，
+再完整解码一遍（JPEG 用 draft 按 1/8 比例解码，熵编码数据仍全部读完，
+截断/损坏照样报错，速度快数倍）。解码是 CPU 密集型，用进程池并行，
+默认进程数等于 CPU 核数。
+
+结果按文件缓存在状态库（decoded_mtime / decode_error），mtime 没变的不再解码；
+解码失败的条目并入核对报告的 corrupt / queue，download.py --queue 直接重下。
+HEIC/HEIF 需要安装 pillow-heif，未安装时跳过（不算损坏）。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, UnidentifiedImageError
+
+import state
+from config import DECODE_FULL, DECODE_WORKERS, DOWNLOAD_DIR
+
+HEIF_EXTS = (".heic", ".heif")
+# 每批交给子进程的文件数：太小进程间往返多，太大负载不均
+CHUNK = 32
+
+
+def heif_supported() -> bool:
+    try:
+        import pillow_heif  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _init_worker():
+    """子进程初始化：注册 HEIF 插件；大图（全景）不当作解压炸弹"""
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+
+def check_file(path: str, full: bool = True):
+    """解码一张图片（在子进程中运行），正常返回 None，否则返回问题描述"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64).lstrip()
+        if head[:1] == b"<":
+            return "内容是 HTML/XML（错误页）"
+        with Image.open(path) as img:
+            img.verify()
+        if full:
+            # verify() 之后图像对象不能再用，需要重新打开
+            with Image.open(path) as img:
+                if img.format == "JPEG":
+                    img.draft(img.mode, (max(1, img.width // 8),
+                                         max(1, img.height // 8)))
+                img.load()
+    except UnidentifiedImageError:
+        return "无法识别的图片格式"
+    except Exception as e:
+        return f"解码失败: {e}"
+    return None
+
+
+def _check(args):
+    """进程池 map 只传一个参数"""
+    return check_file(*args)
+
+
+def _cached(row: dict, mtime: float) -> bool:
+    return row.get("decoded_mtime") == mtime
+
+
+def validate(report: dict, rows: dict, files: dict, full: bool = DECODE_FULL,
+             workers: int = DECODE_WORKERS) -> dict:
+    """解码校验 report["ok"] 中的照片，结果并入 report 并写回缓存
+
+    解码失败的移到 corrupt 并加入 queue。返回统计：
+    checked / cached / skipped / bad / seconds / per_minute。
+    """
+    start = time.monotonic()
+    heif = heif_supported()
+    todo, cached, skipped, bad_cached = [], 0, 0, []
+    for e in report["ok"]:
+        row = rows[e["fsid"]]
+        if state.is_video(row):
+            continue
+        if e["name"].lower().endswith(HEIF_EXTS) and not heif:
+            skipped += 1
+            continue
+        mtime = files[e["name"]][1]
+        if _cached(row, mtime):
+            cached += 1
+            if row.get("decode_error"):
+                bad_cached.append((e, row["decode_error"]))
+        else:
+            todo.append((e, mtime))
+
+    results = []
+    if todo:
+        args = [(str(DOWNLOAD_DIR / e["name"]), full) for e, _ in todo]
+        with ProcessPoolExecutor(max(1, workers),
+                                 initializer=_init_worker) as pool:
+            for i, problem in enumerate(pool.map(_check, args,
+                                                 chunksize=CHUNK), 1):
+                results.append(problem)
+                if i % 5000 == 0:
+                    print(f"  [解码] {i:,}/{len(todo):,}")
+    state.store.set_decoded([(e["fsid"], mtime, problem)
+                             for (e, mtime), problem in zip(todo, results)])
+
+    bad = bad_cached + [(e, problem) for (e, _), problem
+                        in zip(todo, results) if problem]
+    bad_fsids = set()
+    for e, problem in bad:
+        report["corrupt"].append(dict(e, error=problem))
+        report["queue"].append(e["fsid"])
+        bad_fsids.add(e["fsid"])
+    report["ok"] = [e for e in report["ok"] if e["fsid"] not in bad_fsids]
+    report["summary"].update(ok=len(report["ok"]),
+                             corrupt=len(report["corrupt"]))
+    seconds = time.monotonic() - start
+    stats = {"checked": len(todo), "cached": cached, "skipped": skipped,
+             "bad": len(bad), "seconds": round(seconds, 1),
+             "per_minute": round(len(todo) / seconds * 60) if seconds else 0,
+             "workers": workers, "full": full}
+    report["decode"] = stats
+    return stats
+
+
+def format_stats(stats: dict) -> str:
+    mode = "完整解码" if stats["full"] else "结构检查"
+    text = f"{mode} {stats['checked']:,} 张"
+    if stats["checked"]:
+        text += (f"（{stats['workers']} 进程，"
+                 f"{stats['per_minute']:,} 张/分钟）")
+    text += f"，缓存跳过 {stats['cached']:,} 张，损坏 {stats['bad']:,} 张"
+    if stats["skipped"]:
+        text += f"；{stats['skipped']:,} 张 HEIC 未检查（需安装 pillow-heif）"
+    return text
+
+
+def main():
+    """等同于 python check_integrity.py --decode"""
+    import sys
+    import check_integrity
+    if "--decode" not in sys.argv:
+        sys.argv.append("--decode")
+    check_integrity.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# File: tools/yike-album/journal.py
+"""追加式进度日志 + 后台写线程
+
+- BackgroundWriter：工作线程只把记录放进队列，后台线程攒批（BATCH_SIZE 条或
+  FLUSH_INTERVAL 秒）后统一落盘，记录进度时不等文件 I/O
+- Journal：快照文件 + 每行一条 JSON 记录的追加日志；启动时读快照并重放日志，
+  compact() 把当前状态写成新快照（原子替换）并清空日志。
+  崩溃后最多丢失最后一批尚未写出的记录；写到一半的末行在重放时丢弃。
+"""
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from config import JOURNAL_FLUSH_INTERVAL
+
+# 一批最多写这么多条
+BATCH_SIZE = 500
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """单个后台线程按批调用 sink(records)"""
+
+    def __init__(self, sink, name: str = "journal-writer",
+                 interval: float = JOURNAL_FLUSH_INTERVAL):
+        self.sink = sink
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.records = 0
+
+    def put(self, record):
+        self._queue.put(record)
+
+    def flush(self):
+        """等待已入队的记录全部写出"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch, done = [], 1
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+                # 先攒一会儿，凑成一批再写：从这批第一条起最多等 interval 秒，
+                # 记录持续到来时也按时落盘，崩溃最多丢一个间隔的记录
+                deadline = time.monotonic() + self.interval
+                try:
+                    while len(batch) < BATCH_SIZE:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            break
+                        item = self._queue.get(timeout=left)
+                        done += 1
+                        if item is _STOP:
+                            stop = True
+                            break
+                        batch.append(item)
+                except queue.Empty:
+                    pass
+            try:
+                if batch:
+                    self.sink(batch)
+                    self.batches += 1
+                    self.records += len(batch)
+            except Exception as e:
+                print(f"  [日志] 写入失败: {e}")
+            finally:
+                for _ in range(done):
+                    self._queue.task_done()
+
+
+class Journal:
+    """snapshot（JSON）+ log（JSON Lines）"""
+
+    def __init__(self, snapshot: Path, log: Path):
+        self.snapshot = snapshot
+        self.log = log
+
+    def load(self):
+        """返回 (快照数据或 None, 日志记录列表)"""
+        data = None
+        if self.snapshot.exists():
+            data = json.loads(self.snapshot.read_text(encoding="utf-8"))
+        records = []
+        if self.log.exists():
+            with open(self.log, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # 崩溃时写了一半的末行
+        return data, records
+
+    def append(self, records: list):
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n"
+                        for r in records)
+        with open(self.log, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self, data):
+        """写新快照后清空日志（两步之间崩溃只会把日志多重放一遍）"""
+        self.snapshot.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshot.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.snapshot)
+        if self.log.exists():
+            self.log.unlink()
@@ -12,12 +12,12 @@ def print_menu():
     print("请选择操作：")
     print("  1. 完整流程（推荐）- 登录→下载→验证→整理")
     print("  2. 仅登录获取Cookie")
-    print("  3. 仅下载照片")
-    print("  4. 仅下载视频")
+    print("  3. 仅下载照片和视频")
+    print("  4. 补下载失败的视频")
     print("  5. 验证下载完整性")
     print("  6. 按日期整理照片")
     print("  7. 查看下载统计")
-    print("  8. 核对数量")
+    print("  8. 逐条核对（按 fsid 对账，生成补下载报告）")
     print("  0. 退出")
     print()
 
@@ -26,10 +26,10 @@ def run_full_workflow():
     print("\n[步骤1/5] 登录获取Cookie")
     import probe
     probe.main()
-    print("\n[步骤2/5] 下载照片")
+    print("\n[步骤2/5] 下载照片和视频")
     import download
     download.main()
-    print("\n[步骤3/5] 下载视频")
+    print("\n[步骤3/5] 补下载失败的视频")
     import download_video_final
     download_video_final.main()
     print("\n[步骤4/5] 验证完整性")
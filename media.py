@@ -0,0 +1,94 @@
+# File: tools/yike-album/media.py
+"""按媒体类型选择传输参数：照片和视频在同一轮、同一个线程池里下载
+
+每种类型一个 Profile（chunk 大小、超时、请求头、是否走 .part 续传/分段、
+下载后检查）；MediaStats 按类型统计成功/失败/字节数/传输耗时。
+"""
+import threading
+
+import httpx
+
+from config import DOWNLOAD_TIMEOUT
+
+
+class Profile:
+    """一种媒体的传输参数"""
+
+    def __init__(self, kind: str, label: str, chunk_size: int, timeout,
+                 resumable: bool, min_size: int = 0, headers: dict = None):
+        self.kind = kind
+        self.label = label
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        # True：写 .part 支持 Range 续传，大文件分段并行（segments.download）
+        self.resumable = resumable
+        self.min_size = min_size
+        self.headers = headers
+
+    def check(self, size: int, expected_size: int):
+        """下载后检查，有问题返回原因，否则返回 None"""
+        if expected_size and size != expected_size:
+            return f"下载{size} 期望{expected_size}"
+        if size < self.min_size:
+            return f"文件过小 {size}B"
+        return None
+
+
+PHOTO = Profile("photo", "照片", 8192, DOWNLOAD_TIMEOUT, resumable=False,
+                headers={"User-Agent": "pan.baidu.com"})
+# 视频：64KB chunk，连接超时单独放宽；小于 1KB 的肯定是错误页
+VIDEO = Profile("video", "视频", 65536,
+                httpx.Timeout(DOWNLOAD_TIMEOUT, connect=30),
+                resumable=True, min_size=1024)
+
+
+def profile_for(item) -> Profile:
+    """item 为 records.MediaItem"""
+    return VIDEO if item.is_video else PHOTO
+
+
+class MediaStats:
+    """按媒体类型统计：成功/失败数、字节数、传输耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+
+    def _entry(self, kind: str) -> dict:
+        return self._data.setdefault(
+            kind, {"ok": 0, "fail": 0, "bytes": 0, "seconds": 0.0})
+
+    def result(self, item, ok: bool):
+        kind = profile_for(item).kind
+        with self._lock:
+            self._entry(kind)["ok" if ok else "fail"] += 1
+
+    def transfer(self, item, nbytes: int, seconds: float):
+        """记录一次实际传输（跳过的已完成文件不计）"""
+        kind = profile_for(item).kind
+        with self._lock:
+            entry = self._entry(kind)
+            entry["bytes"] += nbytes
+            entry["seconds"] += seconds
+
+    def format_lines(self) -> list:
+        lines = []
+        with self._lock:
+            for profile in (PHOTO, VIDEO):
+                s = self._data.get(profile.kind)
+                if not s:
+                    continue
+                speed = s["bytes"] / s["seconds"] / 1024 / 1024 \
+                    if s["seconds"] else 0.0
+                lines.append(
+                    f"{profile.label}: 成功={s['ok']} 失败={s['fail']} "
+                    f"传输 {s['bytes'] / 1024 / 1024:.1f}MB, "
+                    f"单连接均速 {speed:.2f}MB/s")
+        return lines
+
+
+stats = MediaStats()
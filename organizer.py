@@ -1,13 +1,43 @@
 # File: tools/yike-album/organizer.py
-"""照片整理器：按拍摄日期归类到 YYYY/YYYY-MM/ 文件夹"""
+"""照片整理器：按拍摄日期归类到 YYYY/YYYY-MM/ 文件夹
+
+传输方式（ORGANIZE_MODE / YIKE_ORGANIZE_MODE）：
+- hardlink：硬链接，不占额外空间、瞬间完成；两边是同一份数据，
+  修改整理后的文件会同时改动下载目录中的文件
+- reflink：写时复制克隆（Btrfs/XFS/APFS 等），不占额外空间，两边互不影响
+- copy：完整复制（跨盘或文件系统不支持链接时的兜底）
+- rename：移动到整理目录；下载目录随之清空，之后 check_integrity.py 会把
+  这些条目报告为缺失，只在不再增量下载时使用，需显式指定
+- auto（默认）：启动时在两个目录间实际试一次，按 hardlink → reflink → copy
+  取第一个可用的；跨文件系统时链接和克隆都不可用，只能 copy
+单个文件链接/克隆因跨盘、不支持或硬链接数达到上限失败时改为复制。
+传输在线程池中并行（ORGANIZE_WORKERS），已整理过的文件再次运行时跳过；
+目标位置被另一个文件占用时依次改用 *_dup、*_dup2……，这些名字同样先判断是否已整理过。
+"""
+import ctypes
+import errno
 import os
 import re
 import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
-from config import DOWNLOAD_DIR, ORGANIZED_DIR
+import fileindex
+from config import (
+    DOWNLOAD_DIR, ORGANIZED_DIR, ORGANIZE_MODE, ORGANIZE_WORKERS,
+)
+
+MODES = ("rename", "hardlink", "reflink", "copy")
+# 链接/克隆失败时可以改为复制的错误：跨文件系统、不支持、硬链接数上限等；
+# 目标已存在之类的错误照常抛出，不能用复制覆盖
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK,
+                   errno.EPERM, errno.EINVAL, errno.ENOSYS, errno.ENOTTY}
+# Linux FICLONE ioctl：让目标文件共享源文件的数据块
+FICLONE = 0x40049409
+PROBE_NAME = "_organize_probe.tmp"
 
 
 def extract_date_from_filename(name: str):
@@ -37,9 +67,10 @@ def extract_date_from_exif(filepath: Path):
 
 
 def extract_date_from_mtime(filepath: Path):
-    """回退：用文件修改时间"""
+    """回退：用文件修改时间（优先取目录索引中的 mtime）"""
     try:
-        ts = filepath.stat().st_mtime
+        entry = fileindex.index.get(filepath.name)
+        ts = entry[1] if entry else filepath.stat().st_mtime
         dt = datetime.fromtimestamp(ts)
         return dt.year, dt.month
     except Exception:
@@ -61,6 +92,135 @@ IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".bmp",
               ".webp", ".heic", ".heif", ".mp4", ".mov", ".avi"}
 
 
+def reflink(src: Path, dest: Path):
+    """写时复制克隆；文件系统或平台不支持时抛 OSError"""
+    if sys.platform.startswith("linux"):
+        import fcntl
+        try:
+            with open(src, "rb") as s, open(dest, "wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            dest.unlink(missing_ok=True)
+            raise
+    elif sys.platform == "darwin":
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dest), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(dest))
+    else:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持 reflink", str(dest))
+    shutil.copystat(src, dest)
+
+
+TRANSFER = {
+    "rename": os.rename,
+    "hardlink": os.link,
+    "reflink": reflink,
+    "copy": shutil.copy2,
+}
+
+
+def same_filesystem(a: Path, b: Path) -> bool:
+    return os.stat(a).st_dev == os.stat(b).st_dev
+
+
+def detect_capabilities(src_dir: Path, dest_dir: Path) -> dict:
+    """在两个目录间用一个临时文件实际试验硬链接和克隆"""
+    caps = {"same_fs": same_filesystem(src_dir, dest_dir),
+            "hardlink": False, "reflink": False}
+    probe = src_dir / PROBE_NAME
+    target = dest_dir / PROBE_NAME
+    try:
+        try:
+            probe.write_bytes(b"probe")
+        except OSError:
+            return caps  # 下载目录只读，只能复制
+        for mode in ("hardlink", "reflink"):
+            target.unlink(missing_ok=True)
+            try:
+                TRANSFER[mode](probe, target)
+                caps[mode] = True
+            except OSError:
+                pass
+    finally:
+        target.unlink(missing_ok=True)
+        probe.unlink(missing_ok=True)
+    return caps
+
+
+def choose_mode(requested: str, caps: dict) -> str:
+    """按配置与探测结果选择实际的传输方式"""
+    if requested == "rename":
+        if caps["same_fs"]:
+            return "rename"
+        print("[整理] 整理目录与下载目录不在同一文件系统，无法 rename，改为 copy")
+        return "copy"
+    explicit = requested in MODES
+    if not explicit:
+        if requested != "auto":
+            print(f"[整理] 未知的传输方式 {requested!r}，按 auto 处理")
+        requested = "hardlink"
+    for mode in MODES[MODES.index(requested):]:
+        if mode == "copy" or caps[mode]:
+            if explicit and mode != requested:
+                print(f"[整理] 不支持 {requested}，改为 {mode}")
+            return mode
+    return "copy"
+
+
+def target_path(fp: Path) -> Path:
+    year, month = get_date(fp)
+    if not year:
+        dest_dir = ORGANIZED_DIR / "unknown"
+    else:
+        dest_dir = ORGANIZED_DIR / str(year) / f"{year}-{month:02d}"
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    return dest_dir / fp.name
+
+
+def _already_done(src: Path, dest: Path) -> bool:
+    """目标已存在且就是这个文件（同一 inode，或复制过来的大小和时间一致）"""
+    try:
+        if os.path.samefile(src, dest):
+            return True
+        s, d = src.stat(), dest.stat()
+    except OSError:
+        return False
+    return s.st_size == d.st_size and int(s.st_mtime) == int(d.st_mtime)
+
+
+def _free_target(fp: Path, dest: Path):
+    """依次检查 dest、*_dup、*_dup2……：已整理过返回 None，否则返回第一个空位"""
+    n = 1
+    while os.path.lexists(dest):
+        if _already_done(fp, dest):
+            return None
+        suffix = "_dup" if n == 1 else f"_dup{n}"
+        dest = dest.with_name(f"{fp.stem}{suffix}{fp.suffix}")
+        n += 1
+    return dest
+
+
+def organize_one(fp: Path, mode: str) -> tuple:
+    """整理一个文件，返回 (实际使用的方式或 "skip", 大小)"""
+    size = fp.stat().st_size
+    dest = _free_target(fp, target_path(fp))
+    if dest is None:
+        return "skip", size
+    try:
+        TRANSFER[mode](fp, dest)
+    except OSError as e:
+        if mode not in ("hardlink", "reflink") or \
+                e.errno not in FALLBACK_ERRNOS:
+            raise
+        # 单个文件链接/克隆不可用时退回复制
+        shutil.copy2(fp, dest)
+        mode = "copy"
+    if mode == "rename":
+        fileindex.index.remove(fp.name)
+    return mode, size
+
+
 def main():
     print("=" * 50)
     print("  照片整理器 - 按日期归类")
@@ -69,32 +229,44 @@ def main():
         print(f"[整理] 下载目录不存在: {DOWNLOAD_DIR}")
         sys.exit(1)
     ORGANIZED_DIR.mkdir(parents=True, exist_ok=True)
-    files = [f for f in DOWNLOAD_DIR.iterdir()
-             if f.is_file() and f.suffix.lower() in IMAGE_EXTS]
+    files = [DOWNLOAD_DIR / name for name in fileindex.index.files()
+             if Path(name).suffix.lower() in IMAGE_EXTS]
     if not files:
         print("[整理] 未找到照片文件")
         return
     print(f"[整理] 找到 {len(files)} 个文件")
-    moved, failed = 0, 0
-    for i, fp in enumerate(files, 1):
-        year, month = get_date(fp)
-        if not year:
-            dest_dir = ORGANIZED_DIR / "unknown"
-        else:
-            dest_dir = ORGANIZED_DIR / str(year) / f"{year}-{month:02d}"
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        dest = dest_dir / fp.name
-        if dest.exists():
-            dest = dest_dir / f"{fp.stem}_dup{fp.suffix}"
-        try:
-            shutil.copy2(fp, dest)
-            moved += 1
-        except Exception as e:
-            print(f"  [失败] {fp.name}: {e}")
-            failed += 1
-        if i % 100 == 0:
-            print(f"[整理] 进度: {i}/{len(files)}")
-    print(f"\n[整理] 完成! 移动={moved} 失败={failed}")
+    caps = detect_capabilities(DOWNLOAD_DIR, ORGANIZED_DIR)
+    mode = choose_mode(ORGANIZE_MODE.lower(), caps)
+    print(f"[整理] 同一文件系统: {'是' if caps['same_fs'] else '否'}, "
+          f"硬链接: {'可用' if caps['hardlink'] else '不可用'}, "
+          f"reflink: {'可用' if caps['reflink'] else '不可用'} "
+          f"→ 传输方式 {mode}（{ORGANIZE_WORKERS} 线程）")
+    if mode == "rename":
+        print("[整理] ⚠ rename 会把文件移出下载目录，"
+              "之后不要再运行 check_integrity.py，否则会被当作缺失重下")
+    counts = dict.fromkeys(MODES + ("skip",), 0)
+    copied_bytes, failed, done = 0, 0, 0
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max(1, ORGANIZE_WORKERS),
+                            thread_name_prefix="organize") as pool:
+        futures = {pool.submit(organize_one, fp, mode): fp for fp in files}
+        for fut in as_completed(futures):
+            fp = futures[fut]
+            with lock:
+                done += 1
+                try:
+                    used, size = fut.result()
+                    counts[used] += 1
+                    if used == "copy":
+                        copied_bytes += size
+                except Exception as e:
+                    print(f"  [失败] {fp.name}: {e}")
+                    failed += 1
+                if done % 100 == 0:
+                    print(f"[整理] 进度: {done}/{len(files)}")
+    summary = ", ".join(f"{k}={v}" for k, v in counts.items() if v)
+    print(f"\n[整理] 完成! {summary or '无'} 失败={failed}")
+    print(f"[整理] 实际复制 {copied_bytes / 1024 / 1024:.1f}MB")
     print(f"[整理] 输出目录: {ORGANIZED_DIR}")
 
 
@@ -0,0 +1,166 @@
+# File: tools/yike-album/pipeline.py
+"""两级流水线：少量线程提前解析 dlink → 有界队列 → 大线程池只负责传输字节"""
+import queue
+import threading
+import time
+
+from transport import get_client, close_clients
+
+_DONE = object()
+
+
+class StageStats:
+    """单个阶段的吞吐统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.count = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+
+    def add(self, ok: bool = True, nbytes: int = 0):
+        with self._lock:
+            self.count += 1
+            if not ok:
+                self.failed += 1
+            self.bytes += nbytes
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def byte_rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+
+class Pipeline:
+    """解析阶段 resolvers 个线程，传输阶段 transfers 个线程，中间是有界队列
+
+    resolve_fn(client, item) -> dlink；返回 None 表示无需下载（本地已完整）。
+    API 限速由 resolve_fn 内部的 get_download_link 负责。
+    抛 RuntimeError 视为该条失败；其他异常同样记为失败并打印异常信息。
+    transfer_fn(client, item, dlink) -> bool。
+    on_result(item, ok) 在线程中回调，需自行加锁。
+    name_fn(item) 返回日志里显示的文件名，size_fn(item) 返回字节数（用于吞吐统计）。
+    """
+
+    def __init__(self, cookies: dict, resolve_fn, transfer_fn, on_result,
+                 name_fn, resolvers: int, transfers: int, queue_size: int,
+                 tag: str = "[流水线]", size_fn=lambda item: 0,
+                 report_interval: float = 10.0):
+        self.cookies = cookies
+        self.resolve_fn = resolve_fn
+        self.transfer_fn = transfer_fn
+        self.on_result = on_result
+        self.name_fn = name_fn
+        self.size_fn = size_fn
+        self.resolvers = resolvers
+        self.transfers = transfers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.tag = tag
+        self.report_interval = report_interval
+        self.resolve_stats = StageStats("解析")
+        self.transfer_stats = StageStats("传输")
+        self._depth_samples = 0
+        self._depth_total = 0
+        self._stop = threading.Event()
+
+    def _resolver(self, items, items_lock):
+        client = get_client(self.cookies)
+        while True:
+            with items_lock:
+                item = next(items, _DONE)
+            if item is _DONE:
+                return
+            try:
+                dlink = self.resolve_fn(client, item)
+            except RuntimeError as e:
+                print(f"  [跳过] {self.name_fn(item)}: {e}")
+                self.resolve_stats.add(ok=False)
+                self.on_result(item, False)
+                continue
+            except Exception as e:
+                print(f"  [异常] {self.name_fn(item)}: {e}")
+                self.resolve_stats.add(ok=False)
+                self.on_result(item, False)
+                continue
+            self.resolve_stats.add()
+            # 队列满时阻塞：解析不会无限超前于传输
+            self.queue.put((item, dlink))
+
+    def _transfer(self):
+        client = get_client(self.cookies)
+        while True:
+            entry = self.queue.get()
+            if entry is _DONE:
+                return
+            item, dlink = entry
+            try:
+                ok = self.transfer_fn(client, item, dlink)
+            except Exception as e:
+                print(f"  [异常] {self.name_fn(item)}: {e}")
+                self.transfer_stats.add(ok=False)
+                self.on_result(item, False)
+                continue
+            nbytes = self.size_fn(item) if ok and dlink else 0
+            self.transfer_stats.add(ok=ok, nbytes=nbytes)
+            self.on_result(item, ok)
+
+    def _reporter(self):
+        while not self._stop.wait(self.report_interval):
+            self._sample()
+            print(f"{self.tag} {self.format_stats()}")
+
+    def _sample(self):
+        self._depth_samples += 1
+        self._depth_total += self.queue.qsize()
+
+    def format_stats(self) -> str:
+        r, t = self.resolve_stats, self.transfer_stats
+        return (f"解析 {r.count} ({r.rate():.1f}/s, 失败{r.failed}) | "
+                f"队列 {self.queue.qsize()}/{self.queue.maxsize} | "
+                f"传输 {t.count} ({t.rate():.1f}/s, "
+                f"{t.byte_rate() / 1024 / 1024:.2f}MB/s, 失败{t.failed})")
+
+    def bottleneck(self) -> str:
+        """按队列平均占用判断瓶颈：常满说明传输慢，常空说明解析慢"""
+        if not self._depth_samples:
+            return "未知（运行时间过短）"
+        avg = self._depth_total / self._depth_samples
+        fill = avg / self.queue.maxsize
+        if fill > 0.7:
+            return f"传输阶段（队列平均占用 {fill:.0%}）"
+        if fill < 0.2:
+            return f"解析阶段（队列平均占用 {fill:.0%}）"
+        return f"两阶段基本平衡（队列平均占用 {fill:.0%}）"
+
+    def run(self, items) -> float:
+        """跑完全部 items，返回耗时(秒)"""
+        start = time.monotonic()
+        items_iter = iter(items)
+        items_lock = threading.Lock()
+        resolvers = [threading.Thread(target=self._resolver,
+                                      args=(items_iter, items_lock), daemon=True)
+                     for _ in range(self.resolvers)]
+        transfers = [threading.Thread(target=self._transfer, daemon=True)
+                     for _ in range(self.transfers)]
+        reporter = threading.Thread(target=self._reporter, daemon=True)
+        for t in resolvers + transfers:
+            t.start()
+        reporter.start()
+        for t in resolvers:
+            t.join()
+        for _ in transfers:
+            self.queue.put(_DONE)
+        for t in transfers:
+            t.join()
+        self._stop.set()
+        self._sample()
+        close_clients()
+        elapsed = time.monotonic() - start
+        print(f"{self.tag} {self.format_stats()}")
+        print(f"{self.tag} 瓶颈: {self.bottleneck()}")
+        return elapsed
@@ -0,0 +1,64 @@
+# File: tools/yike-album/ratelimit.py
+"""进程级令牌桶：所有访问 API_BASE 的请求（列表、下载链接）共用一个限速
+
+CDN 字节传输不经过这里。令牌按预约方式发放：先记账再在锁外等待，
+同步线程 sleep、异步协程 await，互不阻塞。
+"""
+import asyncio
+import threading
+import time
+
+from config import API_RATE, API_BURST
+
+
+class TokenBucket:
+    """每秒补充 rate 个令牌，最多攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数（令牌可透支，由等待补回）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            self.waited += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def format_stats(self) -> str:
+        avg = self.waited / self.acquired if self.acquired else 0.0
+        return (f"API 请求 {self.acquired} 次, 限速 {self.rate:g}/s "
+                f"(突发 {self.burst}), 平均等待 {avg:.2f}s")
+
+
+api_bucket = TokenBucket(API_RATE, API_BURST)
+
+
+def acquire_api():
+    """调用 API_BASE 之前取令牌"""
+    api_bucket.acquire()
+
+
+async def acquire_api_async():
+    await api_bucket.acquire_async()
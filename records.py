@@ -0,0 +1,87 @@
+# File: tools/yike-album/records.py
+"""列表条目的紧凑表示：只保留下载需要的字段，文件名用到时再算
+
+列表 API 每条返回几十个字段（含 extra_info 等嵌套 dict），原样留在内存里
+20 万条要占数百 MB。MediaItem 用 __slots__，每条只保存 fsid、扩展名、大小、
+md5、拍摄时间、EXIF 时间和是否视频；完整 path 等元数据在同步时写入状态库。
+"""
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from state import VIDEO_EXTS
+
+# format_filename 的输出：<拍摄时间>_<fsid><扩展名> 或 unknown_<fsid><扩展名>
+_FSID_IN_NAME = re.compile(r"^(?:\d{8}_\d{6}|unknown)_(\d+)\.")
+
+
+def format_filename(fsid: str, ext: str, exif_time: str = None,
+                    shoot_time: int = 0) -> str:
+    """根据拍摄时间生成文件名：优先 EXIF 时间，其次 shoot_time"""
+    if exif_time:
+        try:
+            dt = datetime.strptime(exif_time, "%Y:%m:%d %H:%M:%S")
+            return dt.strftime("%Y%m%d_%H%M%S") + f"_{fsid}{ext}"
+        except ValueError:
+            pass
+    if shoot_time:
+        dt = datetime.fromtimestamp(shoot_time)
+        return dt.strftime("%Y%m%d_%H%M%S") + f"_{fsid}{ext}"
+    return f"unknown_{fsid}{ext}"
+
+
+def parse_fsid(filename: str):
+    """从 format_filename 生成的文件名取回 fsid，认不出返回 None"""
+    m = _FSID_IN_NAME.match(filename)
+    return m.group(1) if m else None
+
+
+class MediaItem:
+    """一个待下载条目（照片或视频）"""
+
+    __slots__ = ("fsid", "ext", "size", "md5", "shoot_time", "exif_time",
+                 "is_video", "checksum", "_filename")
+
+    def __init__(self, fsid, ext: str, size: int = 0, md5: str = None,
+                 shoot_time: int = 0, exif_time: str = None,
+                 filename: str = None):
+        self.fsid = str(fsid)
+        # 扩展名种类很少，驻留后所有条目共用同一个字符串对象
+        self.ext = sys.intern(ext)
+        self.size = size or 0
+        self.md5 = md5
+        self.shoot_time = shoot_time or 0
+        self.exif_time = exif_time or None
+        self.is_video = ext.lower() in VIDEO_EXTS
+        # 内容摘要：状态库中已有的（跳过检查时与 md5 比对），下载后换成新算出的
+        self.checksum = None
+        # 只有从状态库恢复的条目才带现成的文件名
+        self._filename = filename
+
+    @classmethod
+    def from_api(cls, raw: dict) -> "MediaItem":
+        """列表 API 原始条目 → MediaItem"""
+        ext = Path(raw.get("path", ".jpg")).suffix or ".jpg"
+        exif = (raw.get("extra_info") or {}).get("date_time")
+        return cls(raw["fsid"], ext, raw.get("size"), raw.get("md5"),
+                   raw.get("shoot_time"), exif)
+
+    @classmethod
+    def from_row(cls, row: dict) -> "MediaItem":
+        """状态库记录 → MediaItem（沿用记录中的文件名）"""
+        ext = Path(row["path"] or row["name"] or ".jpg").suffix or ".jpg"
+        item = cls(row["fsid"], ext, row["size"], row["md5"],
+                   filename=row["name"])
+        item.checksum = row.get("checksum")
+        return item
+
+    @property
+    def filename(self) -> str:
+        if self._filename:
+            return self._filename
+        return format_filename(self.fsid, self.ext, self.exif_time,
+                               self.shoot_time)
+
+    def __repr__(self):
+        return f"MediaItem({self.fsid!r}, {self.ext!r}, size={self.size})"
@@ -5,6 +5,7 @@ import shutil
 import sys
 from pathlib import Path
 
+import videocheck
 from config import DOWNLOAD_DIR
 
 
@@ -25,12 +26,8 @@ def find_ffmpeg() -> str:
 
 
 def is_ts_container(filepath: Path) -> bool:
-    """检查文件是否为 MPEG-TS 封装（0x47 sync byte）"""
-    try:
-        with open(filepath, "rb") as f:
-            return f.read(1) == b"\x47"
-    except (OSError, IOError):
-        return False
+    """检查文件是否为 MPEG-TS 封装（按 188 字节包抽查 0x47 同步字节）"""
+    return videocheck.probe(filepath)[0] == videocheck.TS
 
 
 def remux_one(ffmpeg: str, src: Path) -> bool:
@@ -50,11 +47,11 @@ def remux_one(ffmpeg: str, src: Path) -> bool:
             print(f"  [转封装失败] {src.name}: {result.stderr[:200]}")
             tmp.unlink(missing_ok=True)
             return False
-        # 验证输出文件有效（ftyp 头）
-        with open(tmp, "rb") as f:
-            head = f.read(8)
-        if head[4:8] != b"ftyp":
-            print(f"  [转封装异常] {src.name}: 输出非 MP4/MOV 容器")
+        # 验证输出文件是完整的 MP4/MOV（box 结构铺满文件，含 moov）
+        kind, detail = videocheck.probe(tmp)
+        if kind not in (videocheck.MP4, videocheck.MOV):
+            print(f"  [转封装异常] {src.name}: 输出非完整 MP4/MOV 容器"
+                  f" ({kind}: {detail})")
             tmp.unlink(missing_ok=True)
             return False
         # 替换原文件
@@ -108,7 +105,7 @@ def main():
         print(f"[{i}/{len(ts_videos)}] {f.name} ({f.stat().st_size // 1024}KB)")
         if remux_one(ffmpeg, f):
             ok += 1
-            print(f"  [完成]")
+            print("  [完成]")
         else:
             fail += 1
 
@@ -0,0 +1,156 @@
+# File: tools/yike-album/resume.py
+"""断点续传：先写 <文件名>.part，旁路 <文件名>.part.json 记录 dlink 与已写字节数
+
+中断或大小不符时保留 .part，下次用 Range: bytes=N- 从断点继续；
+服务器不支持 Range（返回 200）时自动退回整文件下载。
+"""
+import json
+from pathlib import Path
+
+import httpx
+
+import bandwidth
+
+# 每写这么多字节更新一次旁路记录
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+
+def part_paths(dest: Path):
+    """返回 (.part 文件, 旁路记录文件)"""
+    return (dest.with_name(dest.name + ".part"),
+            dest.with_name(dest.name + ".part.json"))
+
+
+def discard(dest: Path):
+    """删除断点文件"""
+    for p in part_paths(dest):
+        p.unlink(missing_ok=True)
+
+
+def load_state(dest: Path) -> dict:
+    _, meta = part_paths(dest)
+    if not meta.exists():
+        return {}
+    try:
+        return json.loads(meta.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(dest: Path, dlink: str, offset: int, expected_size: int):
+    _, meta = part_paths(dest)
+    meta.write_text(json.dumps(
+        {"dlink": dlink, "offset": offset, "size": expected_size},
+        ensure_ascii=False), encoding="utf-8")
+
+
+def resume_offset(dest: Path, expected_size: int) -> int:
+    """可续传的起始偏移；.part 与期望大小对不上时清理掉从 0 开始"""
+    part, _ = part_paths(dest)
+    if not part.exists():
+        discard(dest)
+        return 0
+    state = load_state(dest)
+    offset = part.stat().st_size
+    # 分段下载的 .part 是预分配的，文件长度不代表已下载字节数
+    if not state or "segments" in state or \
+            state.get("size") != expected_size or \
+            (expected_size and offset > expected_size):
+        discard(dest)
+        return 0
+    return offset
+
+
+def range_headers(offset: int, headers: dict = None) -> dict:
+    h = dict(headers or {})
+    if offset:
+        h["Range"] = f"bytes={offset}-"
+    return h
+
+
+def open_mode(resp: httpx.Response, offset: int) -> str:
+    """根据响应决定追加还是重写：206 且起点一致才追加"""
+    if offset and resp.status_code == 206:
+        content_range = resp.headers.get("Content-Range", "")
+        if content_range.startswith(f"bytes {offset}-"):
+            return "ab"
+    if offset:
+        print("  [续传] 服务器未接受 Range，改为整文件下载")
+    return "wb"
+
+
+def finish(dest: Path, expected_size: int) -> int:
+    """下载结束：大小正确则 .part → 正式文件；偏小保留待续传；偏大丢弃
+
+    返回最终大小，大小不符抛 RuntimeError。
+    """
+    part, _ = part_paths(dest)
+    actual = part.stat().st_size
+    if expected_size and actual != expected_size:
+        if actual > expected_size:
+            discard(dest)
+        raise RuntimeError(f"大小不符: 下载{actual} 期望{expected_size}")
+    part.replace(dest)
+    discard(dest)
+    return actual
+
+
+def start_digest(digest, part: Path, mode: str, offset: int):
+    """从头写时重置摘要；追加时先补喂 .part 中已有的前缀"""
+    if digest is None:
+        return
+    digest.reset()
+    if mode == "ab" and offset:
+        digest.feed_file(part, offset)
+
+
+def download(
+    client: httpx.Client, dlink: str, dest: Path, expected_size: int,
+    chunk_size: int, timeout, headers: dict = None, on_chunk=None,
+    digest=None,
+) -> int:
+    """带断点续传的流式下载，成功返回文件大小
+
+    失败时保留 .part 与旁路记录，异常原样抛出；on_chunk(n) 用于进度回调。
+    digest（checksum.StreamDigest）随写入增量更新。
+    """
+    part, _ = part_paths(dest)
+    offset = resume_offset(dest, expected_size)
+    if expected_size and offset == expected_size:
+        if digest is not None:
+            digest.invalidate()
+        return finish(dest, expected_size)
+    if offset:
+        print(f"  [续传] {dest.name}: 从 {offset:,} 字节继续")
+    written = offset
+    try:
+        with client.stream(
+            "GET", dlink, timeout=timeout,
+            headers=range_headers(offset, headers),
+        ) as resp:
+            if resp.status_code == 416:
+                discard(dest)
+                resp.raise_for_status()
+            resp.raise_for_status()
+            mode = open_mode(resp, offset)
+            if mode == "wb":
+                written = 0
+            start_digest(digest, part, mode, written)
+            save_state(dest, dlink, written, expected_size)
+            last_checkpoint = written
+            with bandwidth.stream() as bw, open(part, mode) as f:
+                for chunk in resp.iter_bytes(chunk_size):
+                    f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    bw.consume(len(chunk))
+                    written += len(chunk)
+                    if on_chunk:
+                        on_chunk(len(chunk))
+                    if written - last_checkpoint >= CHECKPOINT_BYTES:
+                        save_state(dest, dlink, written, expected_size)
+                        last_checkpoint = written
+    finally:
+        if part.exists():
+            save_state(dest, dlink, part.stat().st_size, expected_size)
+    return finish(dest, expected_size)
@@ -1,12 +1,16 @@
 # File: tools/yike-album/retry_failed.py
-"""重新下载大小不符的文件"""
+"""重新下载大小不符/缺失的文件（状态库中 status=mismatch 或 missing）"""
 import json
-import time
-from pathlib import Path
 
 import httpx
 
-from config import DOWNLOAD_DIR, PROBE_RESULT_FILE, API_BASE, DOWNLOAD_API
+import bandwidth
+import dlink_cache
+import fileindex
+import resume
+import segments
+import state
+from config import DOWNLOAD_DIR, PROBE_RESULT_FILE
 
 def load_cookies():
     data = json.loads(PROBE_RESULT_FILE.read_text(encoding="utf-8"))
@@ -15,52 +19,58 @@ def load_cookies():
         cookies[c["name"]] = c["value"]
     return cookies
 
-def get_download_link(client, fsid):
-    params = {"clienttype": "70", "fsid": fsid}
-    resp = client.get(API_BASE + DOWNLOAD_API, params=params, timeout=30)
-    data = resp.json()
-    if data.get("errno") != 0:
-        raise RuntimeError(f"获取链接失败: errno={data.get('errno')}")
-    return data.get("dlink", "")
-
 def download_file(client, fsid, name, expected_size):
     print(f"\n下载: {name}")
     print(f"  期望大小: {expected_size:,} bytes ({expected_size/1024/1024:.1f}MB)")
     
     dest = DOWNLOAD_DIR / name
-    if dest.exists():
-        dest.unlink()
+    if fileindex.index.get(name):
+        dest.unlink(missing_ok=True)
+        fileindex.index.remove(name)
     
-    dlink = get_download_link(client, fsid)
-    time.sleep(0.2)
+    try:
+        dlink = dlink_cache.get_download_link(client, fsid)
+    except RuntimeError as e:
+        print(f"  ✗ {e}")
+        return False
     
-    with client.stream("GET", dlink, timeout=httpx.Timeout(600, connect=30)) as resp:
-        resp.raise_for_status()
-        with open(dest, "wb") as f:
-            downloaded = 0
-            for chunk in resp.iter_bytes(65536):
-                f.write(chunk)
-                downloaded += len(chunk)
-                if downloaded % (100 * 1024 * 1024) == 0:
-                    print(f"  已下载: {downloaded:,} bytes ({downloaded/1024/1024:.1f}MB)")
+    progress = {"bytes": resume.resume_offset(dest, expected_size)}
     
-    actual_size = dest.stat().st_size
-    print(f"  实际大小: {actual_size:,} bytes ({actual_size/1024/1024:.1f}MB)")
+    def on_chunk(n):
+        before = progress["bytes"]
+        progress["bytes"] += n
+        step = 100 * 1024 * 1024
+        if progress["bytes"] // step != before // step:
+            mb = progress["bytes"] / 1024 / 1024
+            print(f"  已下载: {progress['bytes']:,} bytes ({mb:.1f}MB) "
+                  f"{bandwidth.format_status()}")
     
-    if actual_size == expected_size:
-        print(f"  ✓ 下载成功")
-        return True
-    else:
-        print(f"  ✗ 大小不符")
+    try:
+        actual_size = segments.download(
+            client, dlink, dest, expected_size, 65536,
+            httpx.Timeout(600, connect=30), on_chunk=on_chunk,
+        )
+    except RuntimeError as e:
+        print(f"  ✗ {e}")
         return False
+    except Exception as e:
+        dlink_cache.invalidate_on_error(fsid, e)
+        raise
+    
+    print(f"  实际大小: {actual_size:,} bytes ({actual_size/1024/1024:.1f}MB)")
+    print("  ✓ 下载成功")
+    fileindex.index.add(name, actual_size)
+    state.store.mark(fsid, state.DONE, nbytes=actual_size)
+    return True
 
 def main():
-    mismatch_file = DOWNLOAD_DIR / "_size_mismatch.json"
-    if not mismatch_file.exists():
+    files = [{"fsid": r["fsid"], "name": r["name"] or f"{r['fsid']}.mp4",
+              "expected": r["size"] or 0}
+             for r in state.store.items((state.MISMATCH, state.MISSING))]
+    if not files:
         print("没有大小不符的文件")
         return
     
-    files = json.loads(mismatch_file.read_text(encoding="utf-8"))
     print(f"需要重新下载: {len(files)}个文件\n")
     
     cookies = load_cookies()
@@ -86,6 +96,8 @@ def main():
         print(f"\n完成: 成功{success}/{len(files)}")
     finally:
         client.close()
+        dlink_cache.cache.save()
+        state.store.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,202 @@
+# File: tools/yike-album/segments.py
+"""大文件分段并行下载：按字节区间切成 N 段，多连接写入预分配的 .part 文件
+
+旁路记录 <文件名>.part.json 保存每段已完成字节数，中断后各段分别续传；
+只有所有段写满且总大小一致才改名为正式文件。
+服务器不支持 Range 或文件低于阈值时退回 resume.download 单连接下载。
+额外连接从传输闸门（concurrency）里占名额，与整文件传输共用同一个并发上限，
+AIMD 回退时分段数随之减少；一个文件的所有段共用一个带宽份额。
+"""
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import bandwidth
+import concurrency
+import resume
+from config import SEGMENT_THRESHOLD, SEGMENT_SIZE, SEGMENT_MAX
+from transport import get_client
+
+# 额外连接的线程；实际并发由闸门名额限制，拿不到名额时该文件就少开几段，不排队
+_pool = ThreadPoolExecutor(max_workers=max(1, concurrency.max_transfers()),
+                           thread_name_prefix="segment")
+
+
+class RangeNotSupported(Exception):
+    """服务器对 Range 请求返回了 200"""
+
+
+def segment_count(size: int) -> int:
+    """段数随文件大小增长：每 SEGMENT_SIZE 一段，封顶 SEGMENT_MAX"""
+    if size < SEGMENT_THRESHOLD:
+        return 1
+    return max(2, min(SEGMENT_MAX, math.ceil(size / SEGMENT_SIZE)))
+
+
+def split(size: int, n: int) -> list:
+    """切成 n 段 [start, end, done]，end 为闭区间"""
+    step = math.ceil(size / n)
+    return [[s, min(s + step, size) - 1, 0] for s in range(0, size, step)]
+
+
+def _acquire_lanes(limiter, want: int) -> int:
+    got = 0
+    while got < want and limiter.try_extra():
+        got += 1
+    return got
+
+
+class _Job:
+    """单个文件的分段下载状态"""
+
+    def __init__(self, dlink, dest, size, segs, chunk_size, timeout,
+                 headers, on_chunk, bw):
+        self.dlink = dlink
+        self.headers = headers or {}
+        self.dest = dest
+        self.size = size
+        self.segs = segs
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.on_chunk = on_chunk
+        # 所有段共用的带宽配额（bandwidth.stream()），整个文件只占一份
+        self.bw = bw
+        self.part, _ = resume.part_paths(dest)
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+
+    def checkpoint(self):
+        with self.lock:
+            state = {"dlink": self.dlink, "size": self.size,
+                     "segments": [list(s) for s in self.segs]}
+        _, meta = resume.part_paths(self.dest)
+        meta.write_text(json.dumps(state), encoding="utf-8")
+
+    def fetch(self, client: httpx.Client, seg: list):
+        start, end, done = seg
+        if start + done > end:
+            return
+        headers = dict(self.headers, Range=f"bytes={start + done}-{end}")
+        since_checkpoint = 0
+        with client.stream("GET", self.dlink, timeout=self.timeout,
+                           headers=headers) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise RangeNotSupported()
+            with open(self.part, "r+b") as f:
+                f.seek(start + done)
+                for chunk in resp.iter_bytes(self.chunk_size):
+                    if self.failed.is_set():
+                        return
+                    room = end + 1 - (start + seg[2])
+                    chunk = chunk[:room]
+                    f.write(chunk)
+                    with self.lock:
+                        seg[2] += len(chunk)
+                        if self.on_chunk:
+                            self.on_chunk(len(chunk))
+                    # 限速等待放在锁外，不阻塞其他段
+                    self.bw.consume(len(chunk))
+                    since_checkpoint += len(chunk)
+                    if since_checkpoint >= resume.CHECKPOINT_BYTES:
+                        self.checkpoint()
+                        since_checkpoint = 0
+
+    def complete(self) -> bool:
+        return all(s[0] + s[2] == s[1] + 1 for s in self.segs)
+
+
+def _load_segments(dest, size: int):
+    """读取可续传的分段记录；不匹配则返回 None"""
+    part, _ = resume.part_paths(dest)
+    state = resume.load_state(dest)
+    segs = state.get("segments")
+    if not segs or state.get("size") != size or not part.exists() \
+            or part.stat().st_size != size:
+        return None
+    return segs
+
+
+def download(
+    client: httpx.Client, dlink: str, dest, expected_size: int,
+    chunk_size: int, timeout, headers: dict = None, on_chunk=None,
+    digest=None,
+) -> int:
+    """大文件分段并行下载，小文件/无大小信息走 resume.download，返回最终大小
+
+    各段乱序写入，digest 无法边下边算，标为无效由调用方写完后补算。
+    """
+    n = segment_count(expected_size) if expected_size else 1
+    if n < 2:
+        return resume.download(client, dlink, dest, expected_size,
+                               chunk_size, timeout, headers, on_chunk, digest)
+    if digest is not None:
+        digest.invalidate()
+    segs = _load_segments(dest, expected_size)
+    if segs:
+        left = sum(s[1] + 1 - s[0] - s[2] for s in segs)
+        print(f"  [分段续传] {dest.name}: 剩余 {left:,} 字节, {len(segs)} 段")
+    else:
+        resume.discard(dest)
+        segs = split(expected_size, n)
+        part, _ = resume.part_paths(dest)
+        with open(part, "wb") as f:
+            f.truncate(expected_size)  # 预分配
+    with bandwidth.stream() as bw:
+        job = _Job(dlink, dest, expected_size, segs, chunk_size, timeout,
+                   headers, on_chunk, bw)
+        error = _run_job(client, job)
+    job.checkpoint()
+    if isinstance(error, RangeNotSupported):
+        print(f"  [分段] {dest.name}: 服务器不支持 Range，改为单连接下载")
+        resume.discard(dest)
+        return resume.download(client, dlink, dest, expected_size,
+                               chunk_size, timeout, headers, on_chunk, digest)
+    if error:
+        raise error
+    if not job.complete():
+        raise RuntimeError(f"分段未全部完成: {dest.name}")
+    return resume.finish(dest, expected_size)
+
+
+def _run_job(client: httpx.Client, job: _Job):
+    """本线程跑第 0 条通道，另按拿到的名额开额外通道；返回第一个异常或 None"""
+    job.checkpoint()
+    pending = [s for s in job.segs if s[0] + s[2] <= s[1]]
+    limiter = concurrency.lane_limiter()
+    extra = _acquire_lanes(limiter, max(0, len(pending) - 1))
+    cookies = dict(client.cookies)
+
+    def run_lane(lane_client, lane):
+        try:
+            for seg in lane:
+                if job.failed.is_set():
+                    return
+                job.fetch(lane_client, seg)
+        except BaseException:
+            job.failed.set()
+            raise
+
+    def run_extra(lane):
+        try:
+            run_lane(get_client(cookies), lane)
+        finally:
+            limiter.release_extra()
+
+    # 段分配到 1 + extra 条通道，本线程负责第 0 条
+    lanes = [pending[i::extra + 1] for i in range(extra + 1)]
+    futures = [_pool.submit(run_extra, lane) for lane in lanes[1:]]
+    error = None
+    try:
+        run_lane(client, lanes[0])
+    except BaseException as e:
+        error = e
+    for fut in futures:
+        try:
+            fut.result()
+        except BaseException as e:
+            error = error or e
+    return error
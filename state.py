@@ -0,0 +1,717 @@
+# File: tools/yike-album/state.py
+"""下载状态库：每个 fsid 一条记录，两种后端
+
+- sqlite（默认）：单个 SQLite 文件（WAL 模式）
+- json：快照 _state.json + 追加日志 _state.journal（见 journal.py），
+  启动和结束时压缩成新快照
+两种后端记录下载结果都只是入队，由后台线程批量写入，工作线程不等文件 I/O。
+
+替代原来分散的 download_progress.json / _photo_meta.json / _failed.json /
+_failed_videos.json / _still_missing.json / _size_mismatch.json / _dlink_cache.json。
+首次打开空库时自动导入上述 JSON 文件；也可以手动运行:
+    python state.py import    # 再次合并导入 JSON
+    python state.py export    # 导出为旧格式 JSON（给外部工具用）
+    python state.py           # 查看各状态数量
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from config import (
+    DOWNLOAD_DIR, PROGRESS_FILE, DLINK_CACHE_FILE,
+    STATE_BACKEND, STATE_DB, STATE_SNAPSHOT, STATE_JOURNAL,
+)
+from journal import BackgroundWriter, Journal
+
+# 状态取值
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+MISSING = "missing"
+MISMATCH = "mismatch"
+DELETED = "deleted"      # 全量扫描时云端已不存在
+
+VIDEO_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".m4v"}
+
+COLUMNS = ("fsid", "name", "path", "size", "md5", "status", "attempts",
+           "bytes", "dlink", "dlink_at", "checksum", "error",
+           "created_at", "updated_at", "listed_at",
+           "verified_mtime", "verified_at", "decoded_mtime", "decode_error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    fsid       TEXT PRIMARY KEY,
+    name       TEXT,
+    path       TEXT,
+    size       INTEGER,
+    md5        TEXT,
+    status     TEXT NOT NULL DEFAULT 'pending',
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    bytes      INTEGER,
+    dlink      TEXT,
+    dlink_at   REAL,
+    checksum   TEXT,
+    error      TEXT,
+    created_at REAL,
+    updated_at REAL,
+    listed_at  REAL,
+    verified_mtime REAL,
+    verified_at    REAL,
+    decoded_mtime  REAL,
+    decode_error   TEXT
+);
+CREATE INDEX IF NOT EXISTS items_status ON items(status);
+CREATE TABLE IF NOT EXISTS kv (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def is_video(item: dict) -> bool:
+    name = item.get("path") or item.get("name") or ""
+    return Path(name).suffix.lower() in VIDEO_EXTS
+
+
+class StateStore:
+    """两种后端共用的部分：元数据视图、JSON 导入/导出
+
+    子类提供 upsert_meta / mark / flush / set_status / reset_content /
+    set_verified / set_decoded / save_dlinks / items / item_pages / get_rows / known_fsids /
+    unlisted_since / done_set / dlinks / counts / get_value / set_value /
+    close / _ensure_rows。
+    """
+
+    path: Path
+
+    def meta(self) -> dict:
+        """fsid → 行（有列表元数据、且云端未删除的条目）"""
+        return {r["fsid"]: r for r in self.items()
+                if (r["path"] or r["name"]) and r["status"] != DELETED}
+
+    def import_json(self, download_dir: Path = DOWNLOAD_DIR,
+                    progress_file: Path = PROGRESS_FILE) -> dict:
+        """合并导入旧 JSON 状态文件，返回 {文件名: 条数}"""
+
+        def load(path: Path):
+            if not path.exists():
+                return None
+            try:
+                return json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"[状态] 跳过无法解析的 {path.name}: {e}")
+                return None
+
+        imported = {}
+        meta = load(download_dir / "_photo_meta.json")
+        if meta:
+            self.upsert_meta(meta)
+            imported["_photo_meta.json"] = len(meta)
+        progress = load(progress_file)
+        if progress and progress.get("downloaded"):
+            done = progress["downloaded"]
+            self._ensure_rows(done)
+            self.set_status([(f, DONE, None) for f in done])
+            imported[progress_file.name] = len(done)
+        for filename, status in (("_failed.json", FAILED),
+                                 ("_failed_videos.json", FAILED),
+                                 ("_still_missing.json", MISSING),
+                                 ("_size_mismatch.json", MISMATCH)):
+            data = load(download_dir / filename)
+            if not data:
+                continue
+            self.upsert_meta([{"fsid": d["fsid"], "name": d.get("name"),
+                               "size": d.get("expected")} for d in data])
+            self.set_status([(d["fsid"], status, d.get("actual"))
+                             for d in data])
+            imported[filename] = len(data)
+        dlinks = load(DLINK_CACHE_FILE)
+        if dlinks:
+            self.save_dlinks(dlinks)
+            imported[DLINK_CACHE_FILE.name] = len(dlinks)
+        if imported:
+            summary = ", ".join(f"{k} {v} 条" for k, v in imported.items())
+            print(f"[状态] 已从 JSON 导入: {summary}")
+        return imported
+
+    def listing_error(self):
+        """最近一轮列表同步没拉完时返回失败原因，否则返回 None"""
+        info = self.get_value("listing") or {}
+        if info.get("complete") is False:
+            return info.get("error") or "未知错误"
+        return None
+
+    def export_json(self, download_dir: Path = DOWNLOAD_DIR):
+        """按旧格式写出 JSON 文件"""
+        rows = self.items()
+
+        def write(name: str, data):
+            (download_dir / name).write_text(
+                json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"[状态] 导出 {name}: {len(data)} 条")
+
+        write("_photo_meta.json",
+              [{"fsid": r["fsid"], "path": r["path"], "size": r["size"]}
+               for r in rows if r["path"]])
+        write("_failed.json", [{"fsid": r["fsid"], "name": r["name"]}
+                               for r in rows if r["status"] == FAILED])
+        write("_size_mismatch.json",
+              [{"fsid": r["fsid"], "name": r["name"], "expected": r["size"],
+                "actual": r["bytes"]} for r in rows if r["status"] == MISMATCH])
+        PROGRESS_FILE.write_text(json.dumps(
+            {"downloaded": sorted(r["fsid"] for r in rows
+                                  if r["status"] == DONE)},
+            ensure_ascii=False), encoding="utf-8")
+        print(f"[状态] 导出 {PROGRESS_FILE.name}")
+
+
+class SqliteStore(StateStore):
+    """SQLite 后端；线程安全，连接在第一次使用时打开"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+        # 写线程落盘时持有 _lock；mark() 只用这把小锁，不会等数据库
+        self._writer_lock = threading.Lock()
+        self._writer = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(items)")}
+            for col, kind in (("listed_at", "REAL"),
+                              ("verified_mtime", "REAL"),
+                              ("verified_at", "REAL"),
+                              ("decoded_mtime", "REAL"),
+                              ("decode_error", "TEXT")):
+                if col not in cols:  # 旧库补列
+                    conn.execute(f"ALTER TABLE items ADD COLUMN {col} {kind}")
+            self._conn = conn
+            if not conn.execute("SELECT 1 FROM items LIMIT 1").fetchone():
+                self.import_json()
+        return self._conn
+
+    # ---- 写入 ----
+
+    def upsert_meta(self, items: list):
+        """写入/更新列表元数据（不改变已有状态），items 为含 fsid 的 dict
+
+        同时记下 listed_at（最近一次出现在云端列表中的时间），全量扫描据此找出已删除条目。
+        """
+        now = time.time()
+        rows = [(str(i["fsid"]), i.get("name"), i.get("path"), i.get("size"),
+                 i.get("md5"), now, now, now) for i in items]
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("""
+                    INSERT INTO items (fsid, name, path, size, md5,
+                                       created_at, updated_at, listed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(fsid) DO UPDATE SET
+                        name = COALESCE(excluded.name, name),
+                        path = COALESCE(excluded.path, path),
+                        size = COALESCE(excluded.size, size),
+                        md5 = COALESCE(excluded.md5, md5),
+                        updated_at = excluded.updated_at,
+                        listed_at = excluded.listed_at
+                """, rows)
+
+    def mark(self, fsid, status: str, nbytes: int = None, error: str = None,
+             checksum: str = None, mtime: float = None):
+        """记录一次下载结果（入队，后台线程批量落盘），attempts 自增
+
+        checksum 为下载时算出的内容摘要（如 "b2:..."），None 表示不改原值；
+        同时给出文件 mtime 时视为刚校验过（校验缓存：大小+mtime 不变即不重读）。
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = BackgroundWriter(self._write_marks,
+                                                name="state-writer")
+            writer = self._writer
+        writer.put((str(fsid), status, nbytes, error, time.time(), checksum,
+                    mtime))
+
+    def _write_marks(self, batch: list):
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("""
+                    INSERT INTO items (fsid, status, attempts, bytes, error,
+                                       created_at, updated_at, checksum,
+                                       verified_mtime, verified_at)
+                    VALUES (?1, ?2, 1, ?3, ?4, ?5, ?5, ?6, ?7,
+                            CASE WHEN ?7 IS NULL THEN NULL ELSE ?5 END)
+                    ON CONFLICT(fsid) DO UPDATE SET
+                        status = ?2, attempts = attempts + 1,
+                        bytes = COALESCE(?3, bytes), error = ?4,
+                        updated_at = ?5, checksum = COALESCE(?6, checksum),
+                        verified_mtime = COALESCE(?7, verified_mtime),
+                        verified_at = CASE WHEN ?7 IS NULL THEN verified_at
+                                           ELSE ?5 END
+                """, batch)
+
+    def flush(self):
+        """等待已记录的结果全部写入"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def set_status(self, rows: list):
+        """批量设置校验结果 [(fsid, status, 实际大小或 None)]，不计入 attempts"""
+        now = time.time()
+        self.flush()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "UPDATE items SET status = ?, bytes = COALESCE(?, bytes), "
+                    "updated_at = ? WHERE fsid = ?",
+                    [(status, nbytes, now, str(fsid))
+                     for fsid, status, nbytes in rows])
+
+    def reset_content(self, fsids: list):
+        """云端内容已变化：改回 pending，清空校验和与校验/解码缓存"""
+        now = time.time()
+        self.flush()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "UPDATE items SET status = ?, bytes = NULL, checksum = NULL, "
+                    "verified_mtime = NULL, verified_at = NULL, "
+                    "decoded_mtime = NULL, decode_error = NULL, updated_at = ? "
+                    "WHERE fsid = ?",
+                    [(PENDING, now, str(fsid)) for fsid in fsids])
+
+    def set_verified(self, rows: list):
+        """记录重读校验通过的文件 [(fsid, 大小, mtime, 校验和)]"""
+        now = time.time()
+        self.flush()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "UPDATE items SET bytes = ?, verified_mtime = ?, "
+                    "checksum = ?, verified_at = ? WHERE fsid = ?",
+                    [(nbytes, mtime, digest, now, str(fsid))
+                     for fsid, nbytes, mtime, digest in rows])
+
+    def set_decoded(self, rows: list):
+        """记录图片解码校验结果 [(fsid, mtime, 问题或 None)]"""
+        self.flush()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "UPDATE items SET decoded_mtime = ?, decode_error = ? "
+                    "WHERE fsid = ?",
+                    [(mtime, error, str(fsid)) for fsid, mtime, error in rows])
+
+    def save_dlinks(self, entries: dict):
+        """dlink 缓存落盘：{fsid: [dlink, fetched_at] 或 None(失效)}"""
+        rows = [(str(k), v[0] if v else None, v[1] if v else None)
+                for k, v in entries.items()]
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("""
+                    INSERT INTO items (fsid, dlink, dlink_at) VALUES (?1, ?2, ?3)
+                    ON CONFLICT(fsid) DO UPDATE SET dlink = ?2, dlink_at = ?3
+                """, rows)
+
+    def _ensure_rows(self, fsids: list):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT OR IGNORE INTO items (fsid, created_at, updated_at) "
+                    "VALUES (?, ?, ?)", [(str(f), now, now) for f in fsids])
+
+    def set_value(self, key: str, value):
+        """保存一个运行参数（JSON 可序列化），如上次全量扫描时间"""
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                           (key, json.dumps(value, ensure_ascii=False)))
+
+    # ---- 读取 ----
+
+    def get_value(self, key: str, default=None):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def items(self, status=None) -> list:
+        """按状态查询，status 可以是字符串或元组；返回 dict 列表"""
+        self.flush()
+        with self._lock:
+            db = self._db()
+            if status is None:
+                cur = db.execute("SELECT * FROM items ORDER BY rowid")
+            else:
+                if isinstance(status, str):
+                    status = (status,)
+                marks = ",".join("?" * len(status))
+                cur = db.execute(
+                    f"SELECT * FROM items WHERE status IN ({marks}) "
+                    f"ORDER BY rowid", tuple(status))
+            return [dict(r) for r in cur.fetchall()]
+
+    def item_pages(self, status, page_size: int):
+        """按 rowid 分页（keyset）逐页 yield 指定状态的行，内存只放一页
+
+        翻页期间其他线程改动状态不影响游标；已翻过的行不会重复出现。
+        """
+        if isinstance(status, str):
+            status = (status,)
+        marks = ",".join("?" * len(status))
+        last = 0
+        while True:
+            self.flush()
+            with self._lock:
+                rows = self._db().execute(
+                    f"SELECT rowid AS _rowid, * FROM items "
+                    f"WHERE status IN ({marks}) AND rowid > ? "
+                    f"ORDER BY rowid LIMIT ?",
+                    tuple(status) + (last, page_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1]["_rowid"]
+            page = [dict(r) for r in rows]
+            for r in page:
+                del r["_rowid"]
+            yield page
+
+    def get_rows(self, fsids: list) -> dict:
+        """按 fsid 批量查询（只查给定的几条，不加载全表）"""
+        fsids = [str(f) for f in fsids]
+        rows = {}
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(fsids), 500):
+                chunk = fsids[i:i + 500]
+                cur = db.execute(
+                    f"SELECT * FROM items WHERE fsid IN "
+                    f"({','.join('?' * len(chunk))})", chunk)
+                rows.update((r["fsid"], dict(r)) for r in cur.fetchall())
+        return rows
+
+    def known_fsids(self) -> set:
+        """有列表元数据、且云端未删除的 fsid"""
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT fsid FROM items WHERE status != ? "
+                "AND (path IS NOT NULL OR name IS NOT NULL)", (DELETED,))
+            return {r[0] for r in cur.fetchall()}
+
+    def unlisted_since(self, since: float) -> set:
+        """自 since 起没有出现在列表中的已知 fsid（全量扫描结束时即云端已删除）"""
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT fsid FROM items WHERE status != ? "
+                "AND (path IS NOT NULL OR name IS NOT NULL) "
+                "AND (listed_at IS NULL OR listed_at < ?)", (DELETED, since))
+            return {r[0] for r in cur.fetchall()}
+
+    def done_set(self) -> set:
+        self.flush()
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT fsid FROM items WHERE status = ?", (DONE,))
+            return {r[0] for r in cur.fetchall()}
+
+    def dlinks(self, ttl: float) -> dict:
+        """未过期的 dlink：{fsid: [dlink, fetched_at]}"""
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT fsid, dlink, dlink_at FROM items "
+                "WHERE dlink IS NOT NULL AND dlink_at > ?",
+                (time.time() - ttl,))
+            return {r[0]: [r[1], r[2]] for r in cur.fetchall()}
+
+    def counts(self) -> dict:
+        self.flush()
+        with self._lock:
+            cur = self._db().execute(
+                "SELECT status, COUNT(*) FROM items GROUP BY status")
+            return {r[0]: r[1] for r in cur.fetchall()}
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JournalStore(StateStore):
+    """JSON 后端：内存中保存全部记录，改动同时追加到日志
+
+    启动时读快照、重放日志并压缩；close() 时再压缩一次。
+    """
+
+    def __init__(self, snapshot: Path, log: Path):
+        self.path = snapshot
+        self.journal = Journal(snapshot, log)
+        self._rows = None
+        self._kv = {}
+        self._lock = threading.RLock()
+        self._writer = None
+
+    def _snapshot(self) -> dict:
+        return {"items": list(self._rows.values()), "kv": self._kv}
+
+    def _data(self) -> dict:
+        with self._lock:
+            if self._rows is None:
+                data, records = self.journal.load()
+                data = data or {}
+                self._rows = {r["fsid"]: r for r in data.get("items", [])}
+                self._kv = data.get("kv", {})
+                for rec in records:
+                    self._apply(rec)
+                if records:
+                    print(f"[状态] 重放日志 {len(records)} 条")
+                self.journal.compact(self._snapshot())
+                if not data and not records:
+                    self.import_json()
+            return self._rows
+
+    def _log(self, rec: dict):
+        """先改内存，再交给后台线程追加到日志"""
+        with self._lock:
+            self._data()
+            self._apply(rec)
+            if self._writer is None:
+                self._writer = BackgroundWriter(self.journal.append)
+            writer = self._writer
+        writer.put(rec)
+
+    def _row(self, fsid: str, now: float) -> dict:
+        row = self._rows.get(fsid)
+        if row is None:
+            row = dict.fromkeys(COLUMNS)
+            row.update(fsid=fsid, status=PENDING, attempts=0,
+                       created_at=now, updated_at=now)
+            self._rows[fsid] = row
+        return row
+
+    def _apply(self, rec: dict):
+        op, now = rec["op"], rec["t"]
+        if op == "meta":
+            for item in rec["items"]:
+                row = self._row(item["fsid"], now)
+                for key in ("name", "path", "size", "md5"):
+                    if item.get(key) is not None:
+                        row[key] = item[key]
+                row["updated_at"] = row["listed_at"] = now
+        elif op == "mark":
+            row = self._row(rec["fsid"], now)
+            row["status"] = rec["status"]
+            row["attempts"] += 1
+            if rec["bytes"] is not None:
+                row["bytes"] = rec["bytes"]
+            if rec.get("checksum") is not None:
+                row["checksum"] = rec["checksum"]
+            if rec.get("mtime") is not None:
+                row["verified_mtime"] = rec["mtime"]
+                row["verified_at"] = now
+            row["error"] = rec["error"]
+            row["updated_at"] = now
+        elif op == "status":
+            for fsid, status, nbytes in rec["rows"]:
+                row = self._rows.get(fsid)
+                if row is None:
+                    continue
+                row["status"] = status
+                if nbytes is not None:
+                    row["bytes"] = nbytes
+                row["updated_at"] = now
+        elif op == "reset":
+            for fsid in rec["fsids"]:
+                row = self._rows.get(fsid)
+                if row is None:
+                    continue
+                row.update(status=PENDING, bytes=None, checksum=None,
+                           verified_mtime=None, verified_at=None,
+                           decoded_mtime=None, decode_error=None,
+                           updated_at=now)
+        elif op == "verified":
+            for fsid, nbytes, mtime, digest in rec["rows"]:
+                row = self._rows.get(fsid)
+                if row is None:
+                    continue
+                row.update(bytes=nbytes, verified_mtime=mtime,
+                           checksum=digest, verified_at=now)
+        elif op == "decoded":
+            for fsid, mtime, error in rec["rows"]:
+                row = self._rows.get(fsid)
+                if row is not None:
+                    row.update(decoded_mtime=mtime, decode_error=error)
+        elif op == "dlinks":
+            for fsid, entry in rec["entries"].items():
+                row = self._row(fsid, now)
+                row["dlink"], row["dlink_at"] = entry or (None, None)
+        elif op == "ensure":
+            for fsid in rec["fsids"]:
+                self._row(fsid, now)
+        elif op == "kv":
+            self._kv[rec["key"]] = rec["value"]
+
+    # ---- 写入 ----
+
+    def upsert_meta(self, items: list):
+        self._log({"op": "meta", "t": time.time(), "items": [
+            {"fsid": str(i["fsid"]), "name": i.get("name"),
+             "path": i.get("path"), "size": i.get("size"), "md5": i.get("md5")}
+            for i in items]})
+
+    def mark(self, fsid, status: str, nbytes: int = None, error: str = None,
+             checksum: str = None, mtime: float = None):
+        self._log({"op": "mark", "t": time.time(), "fsid": str(fsid),
+                   "status": status, "bytes": nbytes, "error": error,
+                   "checksum": checksum, "mtime": mtime})
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def set_status(self, rows: list):
+        self._log({"op": "status", "t": time.time(),
+                   "rows": [[str(f), s, n] for f, s, n in rows]})
+
+    def reset_content(self, fsids: list):
+        self._log({"op": "reset", "t": time.time(),
+                   "fsids": [str(f) for f in fsids]})
+
+    def set_verified(self, rows: list):
+        self._log({"op": "verified", "t": time.time(),
+                   "rows": [[str(f), n, m, d] for f, n, m, d in rows]})
+
+    def set_decoded(self, rows: list):
+        if rows:
+            self._log({"op": "decoded", "t": time.time(),
+                       "rows": [[str(f), m, e] for f, m, e in rows]})
+
+    def save_dlinks(self, entries: dict):
+        self._log({"op": "dlinks", "t": time.time(),
+                   "entries": {str(k): v for k, v in entries.items()}})
+
+    def _ensure_rows(self, fsids: list):
+        self._log({"op": "ensure", "t": time.time(),
+                   "fsids": [str(f) for f in fsids]})
+
+    def set_value(self, key: str, value):
+        self._log({"op": "kv", "t": time.time(), "key": key, "value": value})
+
+    def get_value(self, key: str, default=None):
+        with self._lock:
+            self._data()
+            return self._kv.get(key, default)
+
+    # ---- 读取 ----
+
+    def items(self, status=None) -> list:
+        if isinstance(status, str):
+            status = (status,)
+        with self._lock:
+            return [dict(r) for r in self._data().values()
+                    if status is None or r["status"] in status]
+
+    def item_pages(self, status, page_size: int):
+        """逐页 yield 指定状态的行：行本来就在内存里，只按页拷贝"""
+        if isinstance(status, str):
+            status = (status,)
+        with self._lock:
+            fsids = [f for f, r in self._data().items() if r["status"] in status]
+        for i in range(0, len(fsids), page_size):
+            with self._lock:
+                data = self._data()
+                page = [dict(data[f]) for f in fsids[i:i + page_size]
+                        if data[f]["status"] in status]
+            if page:
+                yield page
+
+    def get_rows(self, fsids: list) -> dict:
+        with self._lock:
+            data = self._data()
+            return {str(f): dict(data[str(f)]) for f in fsids
+                    if str(f) in data}
+
+    def known_fsids(self) -> set:
+        with self._lock:
+            return {f for f, r in self._data().items()
+                    if (r["path"] or r["name"]) and r["status"] != DELETED}
+
+    def unlisted_since(self, since: float) -> set:
+        with self._lock:
+            return {f for f, r in self._data().items()
+                    if (r["path"] or r["name"]) and r["status"] != DELETED
+                    and (r.get("listed_at") or 0) < since}
+
+    def done_set(self) -> set:
+        with self._lock:
+            return {f for f, r in self._data().items() if r["status"] == DONE}
+
+    def dlinks(self, ttl: float) -> dict:
+        cutoff = time.time() - ttl
+        with self._lock:
+            return {f: [r["dlink"], r["dlink_at"]]
+                    for f, r in self._data().items()
+                    if r["dlink"] and r["dlink_at"] > cutoff}
+
+    def counts(self) -> dict:
+        counts = {}
+        with self._lock:
+            for r in self._data().values():
+                counts[r["status"]] = counts.get(r["status"], 0) + 1
+        return counts
+
+    def close(self):
+        """写完日志后压缩成快照"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            if self._rows is not None:
+                self.journal.compact(self._snapshot())
+
+
+if STATE_BACKEND == "json":
+    store = JournalStore(STATE_SNAPSHOT, STATE_JOURNAL)
+else:
+    store = SqliteStore(STATE_DB)
+
+
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if cmd == "import":
+        if not store.import_json():
+            print("[状态] 没有可导入的 JSON 文件")
+    elif cmd == "export":
+        store.export_json()
+    else:
+        counts = store.counts()
+        print(f"[状态] {store.path}")
+        for status, n in sorted(counts.items()):
+            print(f"  {status:<9} {n:,}")
+        print(f"  合计      {sum(counts.values()):,}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
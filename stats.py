@@ -1,6 +1,9 @@
 # File: tools/yike-album/stats.py
 """统计下载的照片和视频"""
 from pathlib import Path
+
+import fileindex
+import state
 from config import DOWNLOAD_DIR
 
 def main():
@@ -15,18 +18,18 @@ def main():
     videos = []
     other = []
     
-    for f in DOWNLOAD_DIR.glob('*'):
-        if not f.is_file() or f.name.startswith('_'):
-            continue
-        ext = f.suffix.lower()
+    # 一次 scandir 拿到全部文件名和大小
+    files = fileindex.index.files()
+    for name in files:
+        ext = Path(name).suffix.lower()
         if ext in photo_exts:
-            photos.append(f)
+            photos.append(name)
         elif ext in video_exts:
-            videos.append(f)
+            videos.append(name)
         else:
-            other.append(f)
+            other.append(name)
     
-    total_size = sum(f.stat().st_size for f in photos + videos + other)
+    total_size = sum(size for size, _ in files.values())
     
     print("=" * 60)
     print("  一刻相册下载统计")
@@ -37,6 +40,11 @@ def main():
         print(f"其他: {len(other):,} 个")
     print(f"\n总计: {len(photos) + len(videos) + len(other):,} 个文件")
     print(f"总大小: {total_size / 1024 / 1024 / 1024:.2f} GB")
+    if state.store.path.exists():
+        counts = state.store.counts()
+        state.store.close()
+        summary = ", ".join(f"{k}={v:,}" for k, v in sorted(counts.items()))
+        print(f"\n状态库: {summary}")
     print(f"\n保存位置: {DOWNLOAD_DIR}")
     print("=" * 60)
 
@@ -0,0 +1,60 @@
+# File: tools/yike-album/test_concurrency.py
+"""AdaptiveLimiter 在照片、视频混合负载下的回退判断（python -m pytest test_concurrency.py）"""
+import random
+
+import concurrency
+
+MB = 1024 * 1024
+
+
+def _latency(nbytes: int, overhead: float, speed: float) -> float:
+    """单个文件耗时 = 固定开销 + 字节数 / 单连接速度"""
+    return overhead + nbytes / speed
+
+
+def _workload(rng: random.Random, n: int) -> list:
+    """九成照片（0.5-8MB），一成视频（20-500MB）"""
+    sizes = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            sizes.append(rng.randint(20 * MB, 500 * MB))
+        else:
+            sizes.append(rng.randint(MB // 2, 8 * MB))
+    return sizes
+
+
+def _window(limiter, sizes: list, overhead: float, speed: float):
+    """把一批完成的传输喂给 limiter，最后一个完成时窗口到期、触发一次判断"""
+    for i, nbytes in enumerate(sizes):
+        limiter.acquire()
+        if i == len(sizes) - 1:
+            limiter._win_start -= limiter.window
+        limiter.release(_latency(nbytes, overhead, speed), nbytes)
+
+
+def _limiter():
+    return concurrency.AdaptiveLimiter(8, 2, 64, window=10.0, tag="[测试]")
+
+
+def test_mixed_sizes_do_not_trigger_backoff():
+    """链路正常时，照片基线之后出现的视频不算延迟飙升（按单文件耗时比较会回退）"""
+    rng = random.Random(1)
+    limiter = _limiter()
+    # 第一个窗口只有照片，建立照片的基线
+    _window(limiter, [rng.randint(MB // 2, 8 * MB) for _ in range(30)],
+            0.15, 5 * MB)
+    for _ in range(20):
+        before = limiter.limit
+        _window(limiter, _workload(rng, 30), 0.15, 5 * MB)
+        assert limiter.limit >= before
+
+
+def test_same_class_slowdown_backs_off():
+    rng = random.Random(2)
+    limiter = _limiter()
+    for _ in range(5):
+        _window(limiter, _workload(rng, 30), 0.15, 5 * MB)
+    before = limiter.limit
+    # 拥塞：固定开销变大、单连接速度下降
+    _window(limiter, _workload(rng, 30), 0.6, 1.5 * MB)
+    assert limiter.limit < before
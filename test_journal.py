@@ -0,0 +1,33 @@
+# File: tools/yike-album/test_journal.py
+"""BackgroundWriter 的落盘时限（python -m pytest test_journal.py）"""
+import threading
+import time
+
+from journal import BackgroundWriter
+
+
+def test_steady_puts_flush_within_interval():
+    """记录持续到来（间隔小于 interval）时，每条也在约一个 interval 内写出"""
+    written = {}
+    lock = threading.Lock()
+
+    def sink(batch):
+        now = time.monotonic()
+        with lock:
+            for i in batch:
+                written[i] = now
+
+    interval = 0.3
+    writer = BackgroundWriter(sink, name="test-writer", interval=interval)
+    put_at = {}
+    for i in range(12):
+        put_at[i] = time.monotonic()
+        writer.put(i)
+        time.sleep(interval / 3)
+    # 不调用 flush/close：只靠时限，最后一条也应在一个 interval 后写出
+    time.sleep(interval * 2)
+    with lock:
+        delays = {i: written[i] - put_at[i] for i in written}
+    writer.close()
+    assert sorted(delays) == list(range(12))
+    assert max(delays.values()) < interval * 1.5
@@ -0,0 +1,146 @@
+# File: tools/yike-album/transport.py
+"""共享传输层：线程内复用的 httpx Client 连接池 + 连接复用统计"""
+import math
+import threading
+
+import httpx
+
+from config import (
+    CONCURRENT_DOWNLOADS, POOL_MAX_CONNECTIONS, POOL_KEEPALIVE_EXPIRY,
+)
+
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Referer": "https://photo.baidu.com/",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Connection": "keep-alive",
+}
+
+
+class ConnStats:
+    """连接复用计数器：请求数 - 新建连接数 = 复用次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def on_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.connects = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = max(0, self.requests - self.connects)
+            rate = reused / self.requests if self.requests else 0.0
+            return {"requests": self.requests, "connects": self.connects,
+                    "reused": reused, "reuse_rate": rate}
+
+
+stats = ConnStats()
+
+
+def _trace(event: str, info: dict):
+    """httpcore trace 回调：每次真正建立 TCP 连接时计数"""
+    if event == "connection.connect_tcp.complete":
+        stats.on_connect()
+
+
+async def _atrace(event: str, info: dict):
+    _trace(event, info)
+
+
+def _on_request(request: httpx.Request):
+    stats.on_request()
+    request.extensions["trace"] = _trace
+
+
+async def _aon_request(request: httpx.Request):
+    stats.on_request()
+    request.extensions["trace"] = _atrace
+
+
+def pool_limits(concurrency: int = CONCURRENT_DOWNLOADS) -> httpx.Limits:
+    """按并发数切分全局连接上限；concurrency=1 表示单线程独占的份额"""
+    share = max(2, math.ceil(
+        POOL_MAX_CONNECTIONS * concurrency / max(1, CONCURRENT_DOWNLOADS)
+    ))
+    return httpx.Limits(
+        max_connections=share,
+        max_keepalive_connections=share,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def make_client(cookies: dict, concurrency: int = 1) -> httpx.Client:
+    """创建带连接池的 httpx Client，完全模仿浏览器"""
+    return httpx.Client(
+        cookies=cookies,
+        headers=BROWSER_HEADERS,
+        follow_redirects=True,
+        timeout=30,
+        limits=pool_limits(concurrency),
+        event_hooks={"request": [_on_request]},
+    )
+
+
+def make_async_client(cookies: dict, concurrency: int) -> httpx.AsyncClient:
+    """创建异步 Client，连接池按 concurrency 个并发槽位计算"""
+    return httpx.AsyncClient(
+        cookies=cookies,
+        headers=BROWSER_HEADERS,
+        follow_redirects=True,
+        timeout=30,
+        limits=pool_limits(concurrency),
+        event_hooks={"request": [_aon_request]},
+    )
+
+
+# 线程本地 Client：httpx Client 不跨线程共享，每个工作线程复用自己的长连接
+_local = threading.local()
+_clients_lock = threading.Lock()
+_clients: list = []
+
+
+def get_client(cookies: dict) -> httpx.Client:
+    """获取当前线程的 Client，首次调用时创建"""
+    client = getattr(_local, "client", None)
+    if client is None or client.is_closed:
+        client = make_client(cookies)
+        _local.client = client
+        with _clients_lock:
+            _clients.append(client)
+    return client
+
+
+def close_clients():
+    """关闭所有线程创建的 Client（在线程池退出后调用）"""
+    with _clients_lock:
+        clients = list(_clients)
+        _clients.clear()
+    for c in clients:
+        try:
+            c.close()
+        except Exception:
+            pass
+
+
+def format_stats() -> str:
+    s = stats.snapshot()
+    return (f"请求={s['requests']} 新建连接={s['connects']} "
+            f"复用={s['reused']} ({s['reuse_rate']:.0%})")
@@ -4,8 +4,11 @@ import json
 import sys
 from pathlib import Path
 from datetime import datetime
-import httpx
-from config import PROBE_RESULT_FILE, API_BASE, DOWNLOAD_API
+from config import PROBE_RESULT_FILE
+# 兼容旧的导入路径：make_client 已移到 transport.py，
+# get_download_link 统一放在 dlink_cache.py
+from dlink_cache import get_download_link  # noqa: F401
+from transport import make_client  # noqa: F401
 
 
 def load_cookies() -> dict:
@@ -23,42 +26,6 @@ def load_cookies() -> dict:
     return cookies
 
 
-def make_client(cookies: dict) -> httpx.Client:
-    """创建 httpx Client，完全模仿浏览器"""
-    return httpx.Client(
-        cookies=cookies,
-        headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            ),
-            "Referer": "https://photo.baidu.com/",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        },
-        follow_redirects=True,
-        timeout=30,
-    )
-
-
-def get_download_link(client: httpx.Client, fsid: str) -> str:
-    """获取下载直链（VIP用户可下载大文件）"""
-    params = {"clienttype": "70", "fsid": fsid}
-    resp = client.get(API_BASE + DOWNLOAD_API, params=params, timeout=30)
-    data = resp.json()
-    if data.get("errno") != 0:
-        errno = data.get("errno")
-        if errno == 50007:
-            raise RuntimeError("需要VIP会员")
-        raise RuntimeError(f"获取链接失败: errno={errno}")
-    dlink = data.get("dlink", "")
-    if not dlink:
-        raise RuntimeError("dlink为空")
-    return dlink
-
-
 def make_filename(photo: dict) -> str:
     """根据拍摄时间生成文件名"""
     ext = Path(photo.get("path", ".jpg")).suffix or ".jpg"
@@ -0,0 +1,206 @@
+# File: tools/yike-album/videocheck.py
+"""视频容器结构校验：只读 box 头（seek 跳过负载），不解码、不读 mdat
+
+MP4/MOV 由一串 box 组成：[4 字节大小][4 字节类型][负载]。逐个 seek 读头部，
+要求顶层 box 恰好铺满整个文件（mdat 声明的长度超出文件即截断），
+有 ftyp、moov，且 moov 里有 mvhd 和 trak。
+MPEG-TS 为 188 字节定长包、每包以 0x47 开头：文件大小须是 188 的整数倍，
+并抽查开头、结尾与均匀分布的包的同步字节（逐包检查需要读完整个文件）。
+分类：mp4 / mov / ts / truncated / unknown。每个文件只有几次小读取，
+线程池并行，整个图库几秒内完成。
+
+python videocheck.py 输出全部视频的分类；verify_download.py 与
+check_integrity.py --decode 把截断/无法识别的视频并入核对报告重下。
+"""
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fileindex
+import state
+from config import DOWNLOAD_DIR, SCAN_WORKERS
+
+MP4 = "mp4"
+MOV = "mov"
+TS = "ts"
+TRUNCATED = "truncated"
+UNKNOWN = "unknown"
+
+# 这些扩展名应当是 MP4/MOV 容器（TS 封装的需要 remux_videos.py 转封装）
+ISO_EXTS = {".mp4", ".mov", ".m4v"}
+# 可能出现在文件开头的顶层 box
+_LEADING = {b"ftyp", b"wide", b"free", b"skip", b"mdat", b"moov", b"pnot"}
+TS_PACKET = 188
+TS_SYNC = 0x47
+# TS 抽查：开头、结尾各这么多包，中间均匀取这么多包
+TS_EDGE = 64
+TS_SPREAD = 256
+
+
+class _Bad(Exception):
+    def __init__(self, kind: str, detail: str):
+        super().__init__(detail)
+        self.kind = kind
+        self.detail = detail
+
+
+def _walk(f, start: int, end: int):
+    """逐个读取 [start, end) 内的 box 头，产出 (类型, 偏移, 大小, 头长度)"""
+    pos = start
+    while pos < end:
+        if end - pos < 8:
+            raise _Bad(TRUNCATED, f"偏移 {pos:,} 处残留 {end - pos} 字节")
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            ext = f.read(8)
+            if len(ext) < 8:
+                raise _Bad(TRUNCATED, f"{kind!r} 的 64 位长度不完整")
+            size = struct.unpack(">Q", ext)[0]
+            header = 16
+        elif size == 0:
+            # 0 表示延伸到末尾（只允许最后一个 box）
+            size = end - pos
+        if not all(32 <= c < 127 for c in kind) or size < header:
+            raise _Bad(UNKNOWN, f"偏移 {pos:,} 处不是合法的 box")
+        if pos + size > end:
+            name = kind.decode("latin-1")
+            raise _Bad(TRUNCATED, f"{name} 声明 {size:,} 字节，"
+                                  f"文件只剩 {end - pos:,} 字节")
+        yield kind, pos, size, header
+        pos += size
+
+
+def _probe_iso(f, size: int) -> tuple:
+    top = {}
+    for kind, pos, box_size, header in _walk(f, 0, size):
+        top.setdefault(kind, (pos, box_size, header))
+    if b"moov" not in top:
+        return TRUNCATED, "缺少 moov（索引未写入，下载或录制中断）"
+    pos, box_size, header = top[b"moov"]
+    children = {kind for kind, *_ in _walk(f, pos + header, pos + box_size)}
+    if b"mvhd" not in children or b"trak" not in children:
+        return UNKNOWN, "moov 中缺少 mvhd/trak"
+    brand = b""
+    if b"ftyp" in top:
+        pos, _, header = top[b"ftyp"]
+        f.seek(pos + header)
+        brand = f.read(4)
+    kind = MOV if brand == b"qt  " else MP4
+    mdat = top.get(b"mdat")
+    detail = f"brand={brand.decode('latin-1').strip() or '-'}"
+    if mdat:
+        detail += f", mdat {mdat[1]:,} 字节"
+    return kind, detail
+
+
+def _probe_ts(f, size: int) -> tuple:
+    if size % TS_PACKET:
+        return TRUNCATED, (f"大小不是 {TS_PACKET} 的整数倍"
+                           f"（末包缺 {TS_PACKET - size % TS_PACKET} 字节）")
+    packets = size // TS_PACKET
+    picks = set(range(min(packets, TS_EDGE)))
+    picks.update(range(max(0, packets - TS_EDGE), packets))
+    picks.update(i * packets // TS_SPREAD for i in range(TS_SPREAD))
+    for i in sorted(picks):
+        f.seek(i * TS_PACKET)
+        if f.read(1) != bytes([TS_SYNC]):
+            return UNKNOWN, f"第 {i:,} 个 TS 包同步字节错误"
+    return TS, f"{packets:,} 个包（抽查 {len(picks)}）"
+
+
+def probe(path: Path) -> tuple:
+    """判断一个视频文件的容器与完整性，返回 (分类, 说明)"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(0)
+            head = f.read(8)
+            if len(head) < 8:
+                return UNKNOWN, f"文件过短 ({size} 字节)"
+            try:
+                if head[4:8] in _LEADING:
+                    return _probe_iso(f, size)
+                if head[0] == TS_SYNC:
+                    return _probe_ts(f, size)
+            except _Bad as e:
+                return e.kind, e.detail
+            return UNKNOWN, f"无法识别的文件头 {head[:8].hex()}"
+    except OSError as e:
+        return UNKNOWN, f"读取失败: {e}"
+
+
+def probe_all(paths: list, workers: int = SCAN_WORKERS) -> list:
+    """并行检查，返回与 paths 对应的 [(分类, 说明)]"""
+    with ThreadPoolExecutor(max(1, workers),
+                            thread_name_prefix="videocheck") as pool:
+        return list(pool.map(probe, paths))
+
+
+def is_problem(name: str, kind: str) -> bool:
+    """截断，或应为 MP4/MOV 却认不出（如错误页）；TS 封装只需转封装，不算损坏"""
+    if kind == TRUNCATED:
+        return True
+    return kind == UNKNOWN and Path(name).suffix.lower() in ISO_EXTS
+
+
+def validate(report: dict, rows: dict, files: dict) -> dict:
+    """检查 report["ok"] 中的视频，有问题的移到 corrupt 并加入 queue
+
+    返回各分类的数量；TS 封装的文件名记在 report["ts"]。
+    """
+    start = time.monotonic()
+    videos = [e for e in report["ok"] if state.is_video(rows[e["fsid"]])]
+    results = probe_all([DOWNLOAD_DIR / e["name"] for e in videos])
+    counts, bad = {}, set()
+    report["ts"] = []
+    for e, (kind, detail) in zip(videos, results):
+        counts[kind] = counts.get(kind, 0) + 1
+        if kind == TS:
+            report["ts"].append(e["name"])
+        if is_problem(e["name"], kind):
+            report["corrupt"].append(dict(e, error=f"{kind}: {detail}"))
+            report["queue"].append(e["fsid"])
+            bad.add(e["fsid"])
+    report["ok"] = [e for e in report["ok"] if e["fsid"] not in bad]
+    report["summary"].update(ok=len(report["ok"]),
+                             corrupt=len(report["corrupt"]))
+    report["containers"] = dict(counts, seconds=round(
+        time.monotonic() - start, 1))
+    return report["containers"]
+
+
+def format_stats(stats: dict) -> str:
+    parts = [f"{kind} {stats[kind]:,}" for kind in
+             (MP4, MOV, TS, TRUNCATED, UNKNOWN) if stats.get(kind)]
+    return f"{', '.join(parts) or '无视频'}（用时 {stats['seconds']}s）"
+
+
+def main():
+    print("=" * 60)
+    print("  视频容器结构校验")
+    print("=" * 60)
+    names = [name for name in fileindex.index.files()
+             if state.is_video({"name": name})]
+    print(f"\n视频文件数: {len(names):,}")
+    start = time.monotonic()
+    results = probe_all([DOWNLOAD_DIR / name for name in names])
+    counts = {}
+    for name, (kind, detail) in zip(names, results):
+        counts[kind] = counts.get(kind, 0) + 1
+        if kind in (TRUNCATED, UNKNOWN):
+            print(f"  [{kind}] {name}: {detail}")
+    counts["seconds"] = round(time.monotonic() - start, 1)
+    print(f"\n[视频] {format_stats(counts)}")
+    if counts.get(TS):
+        print(f"[视频] {counts[TS]:,} 个 TS 封装，可用 remux_videos.py 转封装")
+    if counts.get(TRUNCATED) or counts.get(UNKNOWN):
+        print("[视频] 运行 check_integrity.py --decode 把问题视频写入补下载报告")
+
+
+if __name__ == "__main__":
+    main()